@@ -0,0 +1,270 @@
+"""
+Air quality computations shared by the pipeline DAGs.
+Pure pandas/numpy code with no Airflow or database imports, so the numeric
+and validation rules can be unit tested on their own (see tests/).
+"""
+
+import math
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+# Rolling-window metrics (hours)
+ROLLING_WINDOW_HOURS = 24
+ROLLING_MIN_HOURS = 18  # 75% completeness required for a 24h average
+NOWCAST_HOURS = 12
+
+# Pollutant columns of the pipeline schema; each source sets their accepted
+# range (in its own units) under valid_ranges in config/pipelines.yaml
+READING_COLUMNS = ['SO2', 'NO2', 'O3', 'CO', 'PM10', 'PM2.5']
+
+# Streaming per-station statistics used for data quality flags
+STATS_MIN_SAMPLES = 48  # readings needed before a station's statistics are trusted
+ZSCORE_THRESHOLD = 4.0
+SPIKE_THRESHOLD = 6.0  # hour-to-hour jump, in standard deviations
+FLATLINE_READINGS = 6  # consecutive readings equal at the instrument resolution => stuck sensor
+FLATLINE_MIN_STEPS = 5  # series whose std is under this many resolution steps repeat values normally
+SKETCH_MIN_VALUE = 0.001
+SKETCH_GAMMA = 1.05  # log-bucket growth factor, ~2.5% relative error on quantiles
+SKETCH_BINS = 320
+SKETCH_OUTLIER_QUANTILE = 0.99
+
+# Upper PM2.5 bound of AQI levels 1-5 (anything above is level 6)
+AQI_PM25_BREAKPOINTS = [12, 35.4, 55.4, 150.4, 250.4]
+
+def categorize_pollution(aqi):
+    """Categorize air quality based on AQI"""
+    if aqi is None:
+        return 'Unknown'
+    
+    aqi_int = int(aqi)
+    categories = {
+        1: 'Good',
+        2: 'Moderate',
+        3: 'Unhealthy for Sensitive Groups',
+        4: 'Unhealthy',
+        5: 'Very Unhealthy',
+        6: 'Hazardous'
+    }
+    return categories.get(aqi_int, 'Unknown')
+
+def compute_nowcast(values):
+    """
+    NowCast PM2.5 for every hour of a gap-free hourly series (NaN = missing hour).
+    Uses the EPA 12-hour weighting: w = max(min/max, 0.5), weights w^0..w^11
+    from the newest hour back. An hour is only valid when at least 2 of the 3
+    most recent hours are present.
+    """
+    padded = np.concatenate([np.full(NOWCAST_HOURS - 1, np.nan), values])
+    # One row per hour, newest reading first
+    windows = np.lib.stride_tricks.sliding_window_view(padded, NOWCAST_HOURS)[:, ::-1]
+    present = ~np.isnan(windows)
+    valid = present[:, :3].sum(axis=1) >= 2
+
+    nowcast = np.full(len(values), np.nan)
+    if not valid.any():
+        return nowcast
+
+    windows = windows[valid]
+    present = present[valid]
+    c_min = np.nanmin(windows, axis=1)
+    c_max = np.nanmax(windows, axis=1)
+    ratio = np.divide(c_min, c_max, out=np.ones_like(c_max), where=c_max > 0)
+    weight = np.maximum(ratio, 0.5)
+
+    weights = weight[:, None] ** np.arange(NOWCAST_HOURS)
+    weights = np.where(present, weights, 0.0)
+    weighted_sum = np.nansum(windows * weights, axis=1)
+    nowcast[valid] = np.floor(weighted_sum / weights.sum(axis=1) * 10) / 10
+    return nowcast
+
+def compute_rolling_metrics(hourly, last_hour=None, window=()):
+    """
+    24h rolling average and NowCast PM2.5 for the new hours of one station.
+    `hourly` is the station's PM2.5 per hour (NaN = missing reading);
+    `last_hour` and `window` (trailing hourly values, None = missing) are the
+    state carried over from the previous run. Hours up to `last_hour` are
+    ignored. Returns the metric rows
+    (hour, avg_24h, nowcast, nowcast_aqi, nowcast_category, hours_in_window)
+    and the new state (last_hour, window), or ([], None) if no hour is new.
+    """
+    if last_hour is not None:
+        hourly = hourly[hourly.index > last_hour]
+        if hourly.empty:
+            return [], None
+        carried = pd.Series(
+            [np.nan if v is None else v for v in window],
+            index=pd.date_range(end=last_hour, periods=len(window), freq='h'),
+            dtype=float
+        )
+        series = pd.concat([carried, hourly])
+    else:
+        series = hourly
+
+    # Regular hourly grid: missing hours become NaN
+    series = series.asfreq('h')
+    values = series.to_numpy()
+
+    avg_24h = series.rolling(ROLLING_WINDOW_HOURS, min_periods=ROLLING_MIN_HOURS).mean().to_numpy()
+    hours_in_window = series.rolling(ROLLING_WINDOW_HOURS, min_periods=1).count().to_numpy()
+    nowcast = compute_nowcast(values)
+    nowcast_aqi = np.searchsorted(AQI_PM25_BREAKPOINTS, nowcast, side='left') + 1
+
+    rows = []
+    for i in np.flatnonzero(series.index.isin(hourly.index)):
+        has_nowcast = not np.isnan(nowcast[i])
+        rows.append((
+            series.index[i].to_pydatetime(),
+            None if np.isnan(avg_24h[i]) else round(float(avg_24h[i]), 2),
+            float(nowcast[i]) if has_nowcast else None,
+            int(nowcast_aqi[i]) if has_nowcast else None,
+            categorize_pollution(int(nowcast_aqi[i])) if has_nowcast else 'Unknown',
+            int(hours_in_window[i]),
+        ))
+
+    trailing = values[-ROLLING_WINDOW_HOURS:]
+    state = (
+        series.index[-1].to_pydatetime(),
+        [None if np.isnan(v) else float(v) for v in trailing],
+    )
+    return rows, state
+
+def sketch_bins(values):
+    """Log-spaced histogram bin of each value (bin 0 holds values <= SKETCH_MIN_VALUE)"""
+    scaled = np.maximum(values, SKETCH_MIN_VALUE) / SKETCH_MIN_VALUE
+    bins = np.ceil(np.log(scaled) / np.log(SKETCH_GAMMA))
+    return np.clip(bins, 0, SKETCH_BINS - 1).astype(int)
+
+def sketch_quantile(counts, q):
+    """Approximate q-quantile (upper edge of its bin) from a sketch histogram"""
+    counts = np.asarray(counts, dtype=float)
+    total = counts.sum()
+    if total == 0:
+        return np.nan
+    idx = np.searchsorted(np.cumsum(counts), q * total)
+    return SKETCH_MIN_VALUE * SKETCH_GAMMA ** idx
+
+def score_series(values, bins, timestamps, state, resolution):
+    """
+    Score one station/pollutant series reading by reading, in time order.
+    Every reading is compared with the statistics accumulated before it
+    (stored history plus earlier readings of this batch) and with the reading
+    of the previous hour. Sensor faults (flatline, spike) are kept out of the
+    statistics; z-score outliers are unusual but real, so they are folded in
+    (Welford update) and a lasting change of level is learned.
+    Returns the flag of each reading; `state` is updated in place.
+    """
+    n = state['sample_count']
+    mean = state['running_mean']
+    m2 = state['running_m2']
+    last_value = state['last_value']
+    last_timestamp = state['last_timestamp']
+    repeat_value = state['repeat_value']
+    repeat_count = state['repeat_count']
+    sketch = state['quantile_sketch']
+
+    flags = []
+    for value, bin_index, timestamp in zip(values, bins, timestamps):
+        std = math.sqrt(m2 / n) if n else 0.0
+        trusted = n >= STATS_MIN_SAMPLES and std > 0
+
+        # Readings equal at the instrument's resolution continue the run,
+        # whatever their flag (a stuck sensor keeps repeating after it is flagged)
+        if repeat_value is not None and abs(value - repeat_value) <= resolution / 2:
+            repeat_count += 1
+        else:
+            repeat_value, repeat_count = value, 1
+
+        # A spike is a jump from the previous hour's reading (whatever its
+        # flag) away from the station's mean; falling back towards the mean
+        # after a spike is a recovery, not another spike
+        follows_previous_hour = last_timestamp is not None and timestamp - last_timestamp == timedelta(hours=1)
+        jump = abs(value - last_value) if follows_previous_hour else 0.0
+
+        flag = 'clean'
+        if trusted and repeat_count >= FLATLINE_READINGS and std >= FLATLINE_MIN_STEPS * resolution:
+            flag = 'sensor_flatline'
+        elif trusted and jump > SPIKE_THRESHOLD * std and abs(value - mean) > abs(last_value - mean):
+            flag = 'spike_detected'
+        # z-score alone over-flags skewed pollutant distributions, so the reading
+        # must also be above the station's high quantile from the sketch
+        elif (trusted and abs(value - mean) > ZSCORE_THRESHOLD * std
+              and value > sketch_quantile(sketch, SKETCH_OUTLIER_QUANTILE)):
+            flag = 'zscore_outlier'
+        flags.append(flag)
+        last_value, last_timestamp = value, timestamp
+
+        if flag in ('clean', 'zscore_outlier'):
+            n += 1
+            delta = value - mean
+            mean += delta / n
+            m2 += delta * (value - mean)
+            sketch[bin_index] += 1
+
+    state.update(
+        sample_count=n, running_mean=mean, running_m2=m2,
+        last_value=last_value, last_timestamp=last_timestamp,
+        repeat_value=repeat_value, repeat_count=repeat_count,
+    )
+    return flags
+
+def validate_raw_batch(df, valid_ranges, known_stations=None):
+    """
+    Validate a whole raw extract at once with vectorized checks instead of
+    per-row try/except. Readings are checked against the source's
+    valid_ranges ({column: [low, high]}). Returns (clean_df, rejected_df): clean_df has the
+    raw table columns ready for bulk insert, rejected_df keeps the original
+    columns plus comma-separated reason_codes for the quarantine table.
+    Missing readings (empty cells) are allowed; the transform handles them.
+    """
+    reasons = pd.Series('', index=df.index)
+
+    def add_reason(mask, code):
+        nonlocal reasons
+        reasons = reasons.mask(mask, reasons + code + ',')
+
+    if 'Measurement date' in df.columns:
+        measurement_date = pd.to_datetime(df['Measurement date'], errors='coerce')
+    else:
+        measurement_date = pd.Series(pd.NaT, index=df.index)
+    add_reason(measurement_date.isna(), 'invalid_timestamp')
+
+    if 'Station code' in df.columns:
+        station_code = df['Station code'].astype('string').str.strip()
+    else:
+        station_code = pd.Series(pd.NA, index=df.index, dtype='string')
+    missing_station = station_code.isna() | (station_code == '')
+    add_reason(missing_station, 'missing_station_code')
+    if known_stations is not None:
+        add_reason(~missing_station & ~station_code.isin(known_stations), 'unknown_station')
+
+    readings = {}
+    for column in READING_COLUMNS:
+        low, high = valid_ranges[column]
+        raw = df[column] if column in df.columns else pd.Series(None, index=df.index, dtype=object)
+        value = pd.to_numeric(raw, errors='coerce').astype(float)
+        add_reason(raw.notna() & value.isna(), f"non_numeric_value:{column}")
+        add_reason(value < 0, f"negative_value:{column}")
+        add_reason((value >= 0) & (value < low), f"below_range:{column}")
+        add_reason(value > high, f"out_of_range:{column}")
+        readings[column] = value
+
+    rejected = reasons != ''
+
+    clean_df = pd.DataFrame({
+        'measurement_date': measurement_date,
+        'station_code': station_code,
+        'station_name': df['Station name'].astype('string') if 'Station name' in df.columns else 'UNKNOWN',
+        'so2': readings['SO2'],
+        'no2': readings['NO2'],
+        'o3': readings['O3'],
+        'co': readings['CO'],
+        'pm10': readings['PM10'],
+        'pm25': readings['PM2.5'],
+    })[~rejected]
+
+    rejected_df = df[rejected].copy()
+    rejected_df['reason_codes'] = reasons[rejected].str.rstrip(',')
+
+    return clean_df, rejected_df
@@ -1,6 +1,9 @@
 """
-ELT Pipeline DAG for Air Pollution Analysis
+ELT Pipeline DAGs for Air Pollution Analysis
 Extract → Load (Raw) → Transform → Load (Analytics)
+
+One DAG is generated per monitoring network configured in
+config/pipelines.yaml, each routed to its own Celery queue.
 """
 
 from datetime import datetime, timedelta
@@ -10,9 +13,25 @@ from airflow.operators.bash import BashOperator
 from airflow.providers.postgres.operators.postgres import PostgresOperator
 from airflow.providers.postgres.hooks.postgres import PostgresHook
 from airflow.utils.task_group import TaskGroup
+from airflow.exceptions import AirflowSkipException
+from psycopg2.extras import execute_values, Json
+import numpy as np
 import pandas as pd
+import json
 import os
 import logging
+import yaml
+
+from air_quality import (
+    READING_COLUMNS, SKETCH_BINS,
+    compute_rolling_metrics, score_series, sketch_bins, validate_raw_batch,
+)
+
+try:
+    import duckdb
+    import pyarrow as pa
+except ImportError:  # snapshot export is optional
+    duckdb = None
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -29,22 +48,32 @@ default_args = {
     'email_on_retry': False,
 }
 
-dag = DAG(
-    'elt_air_pollution_pipeline',
-    default_args=default_args,
-    description='ELT Pipeline for Air Pollution Data Analysis',
-    schedule_interval='0 2 * * *',  # Daily at 2 AM
-    catchup=False,
-    tags=['ELT', 'pollution', 'production'],
-)
-
 # ============================================
 # CONFIGURATION
 # ============================================
-POSTGRES_CONN_ID = 'postgres_default'
+PIPELINES_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config', 'pipelines.yaml')
 DATA_DIR = '/home/airflow/data'
-RAW_CSV_PATH = os.path.join(DATA_DIR, 'kaggle/air-pollution-in-seoul/AirPollutionSeoul/Original-Data/Measurement_info.csv')
 PROCESSED_CSV_PATH = os.path.join(DATA_DIR, 'processed_pollution_data.csv')
+SNAPSHOT_DIR = os.path.join(DATA_DIR, 'snapshots')
+ANALYTICS_SNAPSHOT_PATH = os.path.join(SNAPSHOT_DIR, 'analytics.duckdb')
+SNAPSHOT_TABLES = ['analytics_pollution', 'daily_aggregations_pollution', 'rolling_metrics_pollution']
+
+# Pollutants scored by the streaming quality flags (thresholds in air_quality.py)
+STAT_POLLUTANTS = ['so2', 'no2', 'o3', 'co', 'pm10', 'pm25']
+
+# When one reading gets several flags, the highest rank is kept
+QUALITY_FLAG_PRIORITY = {'clean': 0, 'zscore_outlier': 1, 'spike_detected': 2, 'sensor_flatline': 3}
+
+# PostgreSQL column types -> Arrow types used to move snapshot rows into DuckDB
+ARROW_TYPES = {
+    'bigint': 'int64',
+    'integer': 'int32',
+    'double precision': 'float64',
+    'date': 'date32',
+    'timestamp without time zone': 'timestamp[us]',
+    'character varying': 'string',
+}
+SNAPSHOT_CHUNK_ROWS = 50000
 
 # Ensure data directory exists
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -53,14 +82,47 @@ os.makedirs(DATA_DIR, exist_ok=True)
 # PYTHON FUNCTIONS FOR TASKS
 # ============================================
 
-def extract_data(**context):
+def load_pipeline_sources(config_path=PIPELINES_CONFIG_PATH):
+    """
+    Read config/pipelines.yaml and return one settings dict per source,
+    with defaults applied and data paths made absolute
+    """
+    with open(config_path) as config_file:
+        config = yaml.safe_load(config_file) or {}
+
+    defaults = config.get('defaults') or {}
+    sources = []
+    for source_id, settings in (config.get('sources') or {}).items():
+        source = {**defaults, **(settings or {}), 'source_id': source_id}
+        source.setdefault('dag_id', f"elt_air_pollution_{source_id}")
+        missing_ranges = [column for column in READING_COLUMNS if column not in (source.get('valid_ranges') or {})]
+        if missing_ranges:
+            raise ValueError(f"Source {source_id} has no valid_ranges for {', '.join(missing_ranges)}")
+        source['raw_csv_path'] = os.path.join(DATA_DIR, source['raw_csv_path'])
+        if source.get('station_info_csv_path'):
+            source['station_info_csv_path'] = os.path.join(DATA_DIR, source['station_info_csv_path'])
+        sources.append(source)
+    return sources
+
+def read_source_csv(source):
+    """Read a source's measurements CSV and rename its columns to the pipeline schema"""
+    column_mapping = source.get('column_mapping') or {}
+    station_column = next(
+        (column for column, target in column_mapping.items() if target == 'Station code'),
+        'Station code'
+    )
+    df = pd.read_csv(source['raw_csv_path'], dtype={station_column: str})
+    return df.rename(columns=column_mapping)
+
+def extract_data(source, **context):
     """
     Extract: Load CSV data from local storage
     This simulates extracting from an API or external source
     """
+    raw_csv_path = source['raw_csv_path']
     try:
-        if not os.path.exists(RAW_CSV_PATH):
-            logger.warning(f"CSV file not found at {RAW_CSV_PATH}")
+        if not os.path.exists(raw_csv_path):
+            logger.warning(f"CSV file not found at {raw_csv_path}")
             logger.info("Creating sample data for demonstration...")
             # Create sample data if doesn't exist
             sample_data = {
@@ -75,12 +137,13 @@ def extract_data(**context):
                 'PM2.5': [15.3, 18.9] * 50,
             }
             df = pd.DataFrame(sample_data)
-            df.to_csv(RAW_CSV_PATH, index=False)
-            logger.info(f"Sample data created at {RAW_CSV_PATH}")
+            os.makedirs(os.path.dirname(raw_csv_path), exist_ok=True)
+            df.to_csv(raw_csv_path, index=False)
+            logger.info(f"Sample data created at {raw_csv_path}")
         
         # Load data
-        df = pd.read_csv(RAW_CSV_PATH)
-        logger.info(f"Extracted {len(df)} records from {RAW_CSV_PATH}")
+        df = read_source_csv(source)
+        logger.info(f"Extracted {len(df)} records from {raw_csv_path}")
         
         # Push to XCom for next tasks
         context['task_instance'].xcom_push(key='extracted_rows', value=len(df))
@@ -88,64 +151,122 @@ def extract_data(**context):
         return {
             'status': 'success',
             'rows_extracted': len(df),
-            'file_path': RAW_CSV_PATH
+            'file_path': raw_csv_path
         }
     except Exception as e:
         logger.error(f"Error in extract_data: {str(e)}")
         raise
 
-def load_raw_data(**context):
+def load_known_stations(source):
+    """
+    Station set of a source: the configured station_codes, else the station
+    info file, else None (unknown-station check disabled)
+    """
+    if source.get('station_codes'):
+        return {str(code).strip() for code in source['station_codes']}
+
+    station_info_csv_path = source.get('station_info_csv_path')
+    if not station_info_csv_path or not os.path.exists(station_info_csv_path):
+        logger.warning(f"No station set for source {source['source_id']}, unknown-station check disabled")
+        return None
+    stations = pd.read_csv(station_info_csv_path, dtype={'Station code': str})
+    return set(stations['Station code'].str.strip())
+
+def load_raw_data(source, **context):
     """
     Load (Raw): Insert raw data as-is into PostgreSQL raw table
-    NO transformations at this stage
+    NO transformations at this stage. The batch is validated first: rejected
+    rows go to quarantine_raw_pollution with reason codes, clean rows are
+    bulk-inserted, all in one transaction.
     """
     try:
         # Read extracted data
-        df = pd.read_csv(RAW_CSV_PATH)
+        df = read_source_csv(source)
         logger.info(f"Loading {len(df)} raw records into PostgreSQL...")
         
+        clean_df, rejected_df = validate_raw_batch(df, source['valid_ranges'], load_known_stations(source))
+        logger.info(f"Validation: {len(clean_df)} clean, {len(rejected_df)} quarantined")
+        if not rejected_df.empty:
+            reason_counts = rejected_df['reason_codes'].str.split(',').explode().value_counts()
+            logger.warning(f"Quarantine reasons: {reason_counts.to_dict()}")
+        
         # Connect to PostgreSQL
-        hook = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID)
+        hook = PostgresHook(postgres_conn_id=source['postgres_conn_id'])
         connection = hook.get_conn()
         cursor = connection.cursor()
         
-        # Prepare data for insertion
-        insert_count = 0
-        failed_count = 0
-        
-        for idx, row in df.iterrows():
-            try:
-                # Insert raw data exactly as it comes (no cleaning)
-                insert_query = """
-                    INSERT INTO raw_data_pollution 
-                    (measurement_date, station_code, station_name, so2, no2, o3, co, pm10, pm25, loaded_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT DO NOTHING;
-                """
-                
-                cursor.execute(insert_query, (
-                    pd.to_datetime(row.get('Measurement date', datetime.now())),
-                    str(row.get('Station code', 'UNKNOWN')),
-                    str(row.get('Station name', 'UNKNOWN')),
-                    float(row.get('SO2', 0)) if pd.notna(row.get('SO2')) else None,
-                    float(row.get('NO2', 0)) if pd.notna(row.get('NO2')) else None,
-                    float(row.get('O3', 0)) if pd.notna(row.get('O3')) else None,
-                    float(row.get('CO', 0)) if pd.notna(row.get('CO')) else None,
-                    float(row.get('PM10', 0)) if pd.notna(row.get('PM10')) else None,
-                    float(row.get('PM2.5', 0)) if pd.notna(row.get('PM2.5')) else None,
-                    datetime.now()
-                ))
-                insert_count += 1
-            except Exception as row_error:
-                logger.warning(f"Failed to insert row {idx}: {str(row_error)}")
-                failed_count += 1
+        loaded_at = datetime.now()
+        started_at = loaded_at
+        
+        # Insert raw data exactly as it comes (no cleaning), in bulk
+        clean_rows = [
+            tuple(None if pd.isna(value) else value for value in row) + (source['source_id'], loaded_at)
+            for row in clean_df.itertuples(index=False, name=None)
+        ]
+        inserted = execute_values(cursor, """
+            INSERT INTO raw_data_pollution 
+            (measurement_date, station_code, station_name, so2, no2, o3, co, pm10, pm25, source_id, loaded_at)
+            VALUES %s
+            ON CONFLICT DO NOTHING
+            RETURNING 1
+        """, clean_rows, page_size=5000, fetch=True)
+        insert_count = len(inserted)
+        
+        # Quarantine rejected rows in bulk
+        quarantine_rows = [
+            (
+                context['dag_run'].run_id,
+                source['raw_csv_path'],
+                int(row_number) + 2,  # 1-based line number in the CSV (after the header)
+                reason_codes,
+                Json(
+                    # numpy scalars become native numbers; default=str would store them as strings
+                    {
+                        key: None if pd.isna(value) else value.item() if isinstance(value, np.generic) else value
+                        for key, value in record.items()
+                    },
+                    dumps=lambda obj: json.dumps(obj, default=str)
+                ),
+            )
+            for row_number, reason_codes, record in zip(
+                rejected_df.index,
+                rejected_df['reason_codes'],
+                rejected_df.drop(columns=['reason_codes']).to_dict('records')
+            )
+        ]
+        # Rows already quarantined by an earlier run (same file, same content)
+        # are skipped, so only newly rejected rows count as failures
+        quarantined = execute_values(cursor, """
+            INSERT INTO quarantine_raw_pollution
+            (dag_run_id, source_file, source_row_number, reason_codes, original_row_data)
+            VALUES %s
+            ON CONFLICT DO NOTHING
+            RETURNING 1
+        """, quarantine_rows, page_size=5000, fetch=True)
+        failed_count = len(quarantined)
+        
+        # Log to audit table
+        cursor.execute("""
+            INSERT INTO elt_audit_log 
+            (dag_run_id, task_name, task_status, records_processed, records_failed, execution_time_seconds, started_at, finished_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (
+            context['dag_run'].run_id,
+            'load_raw_data',
+            'success',
+            insert_count,
+            failed_count,
+            (datetime.now() - started_at).total_seconds(),
+            started_at,
+            datetime.now()
+        ))
         
         # Commit transaction
         connection.commit()
         cursor.close()
         connection.close()
         
-        logger.info(f"Raw data loaded: {insert_count} successful, {failed_count} failed")
+        logger.info(f"Raw data loaded: {insert_count} inserted, {failed_count} quarantined")
         
         # Push metrics to XCom
         context['task_instance'].xcom_push(key='raw_inserted', value=insert_count)
@@ -180,69 +301,246 @@ def calculate_aqi(row):
     else:
         return 6
 
-def categorize_pollution(aqi):
-    """Categorize air quality based on AQI"""
-    if aqi is None:
-        return 'Unknown'
-    
-    aqi_int = int(aqi)
-    categories = {
-        1: 'Good',
-        2: 'Moderate',
-        3: 'Unhealthy for Sensitive Groups',
-        4: 'Unhealthy',
-        5: 'Very Unhealthy',
-        6: 'Hazardous'
-    }
-    return categories.get(aqi_int, 'Unknown')
-
-def transform_and_load_analytics(**context):
+def apply_statistical_quality_flags(cursor, new_df, source_id, resolution):
+    """
+    Flag stuck sensors, sudden spikes and statistical outliers in the rows
+    inserted by this run, using per-station/pollutant statistics kept in
+    station_pollutant_stats (running mean/variance, quantile sketch, last
+    reading and its hour, current run of repeated values). Each series is scored in a
+    single streaming pass that continues from the stored state, so history is
+    never re-read and the first batch is checked as soon as enough readings
+    have been seen.
+    Rows that already carry a fixed-threshold flag are left untouched, and
+    missing readings (NULL in the raw table) are skipped.
+    """
+    readings = new_df[new_df['data_quality_flag'] == 'clean'].melt(
+        id_vars=['id', 'station_code', 'hourly_timestamp'],
+        value_vars=[f"{pollutant}_raw" for pollutant in STAT_POLLUTANTS],
+        var_name='pollutant',
+        value_name='value'
+    )
+    readings['value'] = readings['value'].astype(float)
+    readings = readings.dropna(subset=['value'])
+    if readings.empty:
+        return {}
+
+    readings['pollutant'] = readings['pollutant'].str.replace('_raw', '', regex=False)
+    readings = readings.sort_values(
+        ['station_code', 'pollutant', 'hourly_timestamp'], kind='stable'
+    ).reset_index(drop=True)
+
+    cursor.execute("""
+        SELECT station_code, pollutant, sample_count, running_mean, running_m2,
+               last_value, last_timestamp, repeat_value, repeat_count, quantile_sketch
+        FROM station_pollutant_stats
+        WHERE source_id = %s AND station_code = ANY(%s)
+    """, (source_id, list(readings['station_code'].unique())))
+    stored = {(row[0], row[1]): row[2:] for row in cursor.fetchall()}
+
+    values = readings['value'].to_numpy()
+    bins = sketch_bins(values)
+    timestamps = readings['hourly_timestamp'].to_numpy(dtype=object)
+    flags = np.empty(len(readings), dtype=object)
+    stat_rows = []
+    for (station_code, pollutant), positions in readings.groupby(['station_code', 'pollutant']).indices.items():
+        n, mean, m2, last_value, last_timestamp, repeat_value, repeat_count, sketch = stored.get(
+            (station_code, pollutant), (0, 0.0, 0.0, None, None, None, 0, None)
+        )
+        state = {
+            'sample_count': n,
+            'running_mean': mean,
+            'running_m2': m2,
+            'last_value': last_value,
+            'last_timestamp': last_timestamp,
+            'repeat_value': repeat_value,
+            'repeat_count': repeat_count,
+            'quantile_sketch': (
+                np.zeros(SKETCH_BINS, dtype=np.int64) if sketch is None else np.asarray(sketch, dtype=np.int64)
+            ),
+        }
+        flags[positions] = score_series(
+            values[positions].tolist(),
+            bins[positions].tolist(),
+            timestamps[positions],
+            state,
+            resolution.get(pollutant, 0),
+        )
+        stat_rows.append((
+            source_id,
+            station_code,
+            pollutant,
+            int(state['sample_count']),
+            float(state['running_mean']),
+            float(state['running_m2']),
+            state['last_value'],
+            state['last_timestamp'],
+            state['repeat_value'],
+            int(state['repeat_count']),
+            [int(count) for count in state['quantile_sketch']],
+        ))
+
+    readings['flag'] = flags
+    readings['flag_rank'] = readings['flag'].map(QUALITY_FLAG_PRIORITY)
+
+    worst = readings.loc[readings.groupby('id')['flag_rank'].idxmax(), ['id', 'flag', 'flag_rank']]
+    worst = worst[worst['flag_rank'] > 0]
+    if not worst.empty:
+        execute_values(cursor, """
+            UPDATE analytics_pollution a
+            SET data_quality_flag = v.flag
+            FROM (VALUES %s) AS v(id, flag)
+            WHERE a.id = v.id
+        """, [(int(row_id), flag) for row_id, flag in zip(worst['id'], worst['flag'])], page_size=5000)
+
+    execute_values(cursor, """
+        INSERT INTO station_pollutant_stats
+        (source_id, station_code, pollutant, sample_count, running_mean, running_m2,
+         last_value, last_timestamp, repeat_value, repeat_count, quantile_sketch)
+        VALUES %s
+        ON CONFLICT (source_id, station_code, pollutant) DO UPDATE SET
+            sample_count = EXCLUDED.sample_count,
+            running_mean = EXCLUDED.running_mean,
+            running_m2 = EXCLUDED.running_m2,
+            last_value = EXCLUDED.last_value,
+            last_timestamp = EXCLUDED.last_timestamp,
+            repeat_value = EXCLUDED.repeat_value,
+            repeat_count = EXCLUDED.repeat_count,
+            quantile_sketch = EXCLUDED.quantile_sketch,
+            updated_at = CURRENT_TIMESTAMP
+    """, stat_rows, template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::bigint[])")
+
+    return worst['flag'].value_counts().to_dict()
+
+def update_rolling_metrics(cursor, new_df, source_id):
+    """
+    Incrementally maintain 24h rolling averages and NowCast PM2.5 per station.
+    Only the hours inserted by this run are computed: the trailing 24 hours of
+    each station are carried over from rolling_window_state instead of being
+    re-read from analytics_pollution. Hours older than a station's last
+    processed hour are ignored. Uses the raw (nullable) PM2.5 reading: a
+    missing measurement is a gap in the window, not a 0.
+    """
+    if new_df.empty:
+        return 0
+
+    new_df = new_df[['station_code', 'hourly_timestamp', 'pm25_raw']].rename(columns={'pm25_raw': 'pm25'})
+    new_df['hourly_timestamp'] = pd.to_datetime(new_df['hourly_timestamp']).dt.floor('h')
+    new_df['pm25'] = new_df['pm25'].astype(float)
+
+    cursor.execute(
+        "SELECT station_code, last_hour, pm25_window FROM rolling_window_state "
+        "WHERE source_id = %s AND station_code = ANY(%s)",
+        (source_id, list(new_df['station_code'].unique()))
+    )
+    window_state = {code: (last_hour, window or []) for code, last_hour, window in cursor.fetchall()}
+
+    metric_rows = []
+    state_rows = []
+    for station_code, station_df in new_df.groupby('station_code'):
+        hourly = station_df.groupby('hourly_timestamp')['pm25'].mean()
+        last_hour, window = window_state.get(station_code, (None, []))
+        station_metrics, station_state = compute_rolling_metrics(hourly, last_hour, window)
+        if station_state is None:
+            continue
+        metric_rows.extend((source_id, station_code) + row for row in station_metrics)
+        state_rows.append((source_id, station_code) + station_state)
+
+    execute_values(cursor, """
+        INSERT INTO rolling_metrics_pollution
+        (source_id, station_code, hourly_timestamp, pm25_avg_24h, pm25_nowcast, nowcast_aqi, nowcast_category, hours_in_window)
+        VALUES %s
+        ON CONFLICT (source_id, station_code, hourly_timestamp) DO UPDATE SET
+            pm25_avg_24h = EXCLUDED.pm25_avg_24h,
+            pm25_nowcast = EXCLUDED.pm25_nowcast,
+            nowcast_aqi = EXCLUDED.nowcast_aqi,
+            nowcast_category = EXCLUDED.nowcast_category,
+            hours_in_window = EXCLUDED.hours_in_window,
+            computed_at = CURRENT_TIMESTAMP
+    """, metric_rows, page_size=5000)
+
+    execute_values(cursor, """
+        INSERT INTO rolling_window_state (source_id, station_code, last_hour, pm25_window)
+        VALUES %s
+        ON CONFLICT (source_id, station_code) DO UPDATE SET
+            last_hour = EXCLUDED.last_hour,
+            pm25_window = EXCLUDED.pm25_window,
+            updated_at = CURRENT_TIMESTAMP
+    """, state_rows, template="(%s, %s, %s, %s::float8[])")
+
+    return len(metric_rows)
+
+def transform_and_load_analytics(source, **context):
     """
     Transform: Clean data and load into analytics table
     This is the T in ELT - all transformations happen here
     """
     try:
-        hook = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID)
+        hook = PostgresHook(postgres_conn_id=source['postgres_conn_id'])
         connection = hook.get_conn()
         cursor = connection.cursor()
         
         logger.info("Starting transformations...")
         
-        # Step 1: Clean raw data and load to analytics table
+        # Only this source's rows: other networks are transformed by their own DAG
+        source_id = source['source_id']
+        
+        # Step 1: Clean raw data and load to analytics table. The *_clean columns
+        # replace NULL with 0, so the new rows are joined back to their raw row
+        # (raw_id) to keep the nullable readings for the quality flags and the
+        # rolling metrics.
         transform_query = """
-        INSERT INTO analytics_pollution 
-        (measurement_date, station_code, station_name, so2_clean, no2_clean, o3_clean, 
-         co_clean, pm10_clean, pm25_clean, hourly_timestamp, data_quality_flag, transformed_at)
-        SELECT 
-            DATE(r.measurement_date) as measurement_date,
-            r.station_code,
-            r.station_name,
-            COALESCE(r.so2, 0) as so2_clean,
-            COALESCE(r.no2, 0) as no2_clean,
-            COALESCE(r.o3, 0) as o3_clean,
-            COALESCE(r.co, 0) as co_clean,
-            COALESCE(r.pm10, 0) as pm10_clean,
-            COALESCE(r.pm25, 0) as pm25_clean,
-            r.measurement_date as hourly_timestamp,
-            CASE 
-                WHEN r.so2 IS NULL OR r.no2 IS NULL THEN 'incomplete_data'
-                WHEN r.pm10 > 500 OR r.pm25 > 250 THEN 'outlier_detected'
-                ELSE 'clean' 
-            END as data_quality_flag,
-            CURRENT_TIMESTAMP
-        FROM raw_data_pollution r
-        WHERE r.loaded_at > CURRENT_TIMESTAMP - INTERVAL '1 day'
-        AND NOT EXISTS (
-            SELECT 1 FROM analytics_pollution a 
-            WHERE a.hourly_timestamp = r.measurement_date 
-            AND a.station_code = r.station_code
+        WITH inserted AS (
+            INSERT INTO analytics_pollution 
+            (raw_id, source_id, measurement_date, station_code, station_name, so2_clean, no2_clean, o3_clean, 
+             co_clean, pm10_clean, pm25_clean, hourly_timestamp, data_quality_flag, transformed_at)
+            SELECT 
+                r.id as raw_id,
+                r.source_id,
+                DATE(r.measurement_date) as measurement_date,
+                r.station_code,
+                r.station_name,
+                COALESCE(r.so2, 0) as so2_clean,
+                COALESCE(r.no2, 0) as no2_clean,
+                COALESCE(r.o3, 0) as o3_clean,
+                COALESCE(r.co, 0) as co_clean,
+                COALESCE(r.pm10, 0) as pm10_clean,
+                COALESCE(r.pm25, 0) as pm25_clean,
+                r.measurement_date as hourly_timestamp,
+                CASE 
+                    WHEN r.so2 IS NULL OR r.no2 IS NULL THEN 'incomplete_data'
+                    WHEN r.pm10 > 500 OR r.pm25 > 250 THEN 'outlier_detected'
+                    ELSE 'clean' 
+                END as data_quality_flag,
+                CURRENT_TIMESTAMP
+            FROM raw_data_pollution r
+            WHERE r.source_id = %s
+            AND r.loaded_at > CURRENT_TIMESTAMP - INTERVAL '1 day'
+            AND NOT EXISTS (
+                SELECT 1 FROM analytics_pollution a 
+                WHERE a.source_id = r.source_id
+                AND a.hourly_timestamp = r.measurement_date 
+                AND a.station_code = r.station_code
+            )
+            RETURNING id, raw_id, station_code, hourly_timestamp, data_quality_flag
         )
+        SELECT i.id, i.station_code, i.hourly_timestamp, i.data_quality_flag,
+               r.so2 AS so2_raw, r.no2 AS no2_raw, r.o3 AS o3_raw,
+               r.co AS co_raw, r.pm10 AS pm10_raw, r.pm25 AS pm25_raw
+        FROM inserted i
+        JOIN raw_data_pollution r ON r.id = i.raw_id
         """
         
-        cursor.execute(transform_query)
-        transformed_count = cursor.rowcount
+        cursor.execute(transform_query, (source_id,))
+        new_df = pd.DataFrame(cursor.fetchall(), columns=[desc[0] for desc in cursor.description])
+        transformed_count = len(new_df)
         logger.info(f"Transformed {transformed_count} records into analytics table")
         
+        # Step 1b: Statistical quality flags (flatline / spike / z-score)
+        quality_flags = apply_statistical_quality_flags(
+            cursor, new_df, source_id, source.get('measurement_resolution') or {}
+        )
+        logger.info(f"Statistical quality flags: {quality_flags}")
+        
         # Step 2: Calculate AQI
         aqi_query = """
         UPDATE analytics_pollution
@@ -262,22 +560,36 @@ def transform_and_load_analytics(**context):
             WHEN pm25_clean <= 250.4 THEN 'Very Unhealthy'
             ELSE 'Hazardous'
         END
-        WHERE transformed_at > CURRENT_TIMESTAMP - INTERVAL '1 day'
+        WHERE source_id = %s
+        AND transformed_at > CURRENT_TIMESTAMP - INTERVAL '1 day'
         """
         
-        cursor.execute(aqi_query)
+        cursor.execute(aqi_query, (source_id,))
         aqi_count = cursor.rowcount
         logger.info(f"Updated AQI for {aqi_count} records")
         
-        # Step 3: Create daily aggregations
+        # Step 2b: Rolling 24h average and NowCast, only for the new hours
+        rolling_count = update_rolling_metrics(cursor, new_df, source_id)
+        logger.info(f"Computed rolling metrics for {rolling_count} station-hours")
+        
+        # Step 3: Create daily aggregations. Every station-day touched by this
+        # run is recomputed from all of its rows and upserted, so overlapping
+        # windows, retries and manual triggers never duplicate a day.
         agg_query = """
+        WITH touched AS (
+            SELECT DISTINCT measurement_date, station_code
+            FROM analytics_pollution
+            WHERE source_id = %s
+            AND transformed_at > CURRENT_TIMESTAMP - INTERVAL '1 day'
+        )
         INSERT INTO daily_aggregations_pollution
-        (aggregation_date, station_code, station_name, avg_so2, avg_no2, avg_o3, 
+        (source_id, aggregation_date, station_code, station_name, avg_so2, avg_no2, avg_o3, 
          avg_co, avg_pm10, avg_pm25, max_aqi, min_aqi, avg_aqi, records_count)
         SELECT 
+            a.source_id,
             a.measurement_date,
             a.station_code,
-            a.station_name,
+            MAX(a.station_name) as station_name,
             ROUND(AVG(a.so2_clean)::numeric, 2) as avg_so2,
             ROUND(AVG(a.no2_clean)::numeric, 2) as avg_no2,
             ROUND(AVG(a.o3_clean)::numeric, 2) as avg_o3,
@@ -289,14 +601,27 @@ def transform_and_load_analytics(**context):
             ROUND(AVG(a.air_quality_index)::numeric, 2) as avg_aqi,
             COUNT(*) as records_count
         FROM analytics_pollution a
-        WHERE a.transformed_at > CURRENT_TIMESTAMP - INTERVAL '1 day'
-        GROUP BY a.measurement_date, a.station_code, a.station_name
-        ON CONFLICT DO NOTHING
+        JOIN touched t ON t.measurement_date = a.measurement_date AND t.station_code = a.station_code
+        WHERE a.source_id = %s
+        GROUP BY a.source_id, a.measurement_date, a.station_code
+        ON CONFLICT (source_id, aggregation_date, station_code) DO UPDATE SET
+            station_name = EXCLUDED.station_name,
+            avg_so2 = EXCLUDED.avg_so2,
+            avg_no2 = EXCLUDED.avg_no2,
+            avg_o3 = EXCLUDED.avg_o3,
+            avg_co = EXCLUDED.avg_co,
+            avg_pm10 = EXCLUDED.avg_pm10,
+            avg_pm25 = EXCLUDED.avg_pm25,
+            max_aqi = EXCLUDED.max_aqi,
+            min_aqi = EXCLUDED.min_aqi,
+            avg_aqi = EXCLUDED.avg_aqi,
+            records_count = EXCLUDED.records_count,
+            aggregated_at = CURRENT_TIMESTAMP
         """
         
-        cursor.execute(agg_query)
+        cursor.execute(agg_query, (source_id, source_id))
         agg_count = cursor.rowcount
-        logger.info(f"Created {agg_count} daily aggregations")
+        logger.info(f"Created or refreshed {agg_count} daily aggregations")
         
         # Commit transaction
         connection.commit()
@@ -328,27 +653,29 @@ def transform_and_load_analytics(**context):
             'status': 'success',
             'analytics_records': transformed_count,
             'aqi_updated': aqi_count,
+            'rolling_metrics_updated': rolling_count,
+            'quality_flags': quality_flags,
             'aggregations_created': agg_count
         }
     except Exception as e:
         logger.error(f"Error in transform_and_load_analytics: {str(e)}")
         raise
 
-def verify_data_integrity(**context):
+def verify_data_integrity(source, **context):
     """
-    Verify that raw and analytics tables have data and raw is immutable
+    Verify that raw and analytics tables have data for this source and raw is immutable
     """
     try:
-        hook = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID)
+        hook = PostgresHook(postgres_conn_id=source['postgres_conn_id'])
         connection = hook.get_conn()
         cursor = connection.cursor()
         
         # Check raw data count
-        cursor.execute("SELECT COUNT(*) FROM raw_data_pollution")
+        cursor.execute("SELECT COUNT(*) FROM raw_data_pollution WHERE source_id = %s", (source['source_id'],))
         raw_count = cursor.fetchone()[0]
         
         # Check analytics data count
-        cursor.execute("SELECT COUNT(*) FROM analytics_pollution")
+        cursor.execute("SELECT COUNT(*) FROM analytics_pollution WHERE source_id = %s", (source['source_id'],))
         analytics_count = cursor.fetchone()[0]
         
         # Check for NULL values (data quality)
@@ -358,13 +685,14 @@ def verify_data_integrity(**context):
                 COUNT(CASE WHEN no2 IS NULL THEN 1 END) as null_no2,
                 COUNT(CASE WHEN pm25 IS NULL THEN 1 END) as null_pm25
             FROM raw_data_pollution
-        """)
+            WHERE source_id = %s
+        """, (source['source_id'],))
         null_stats = cursor.fetchone()
         
         cursor.close()
         connection.close()
         
-        logger.info(f"Data Integrity Check:")
+        logger.info(f"Data Integrity Check ({source['source_id']}):")
         logger.info(f"  Raw table records: {raw_count}")
         logger.info(f"  Analytics table records: {analytics_count}")
         logger.info(f"  NULL values - SO2: {null_stats[0]}, NO2: {null_stats[1]}, PM2.5: {null_stats[2]}")
@@ -384,42 +712,175 @@ def verify_data_integrity(**context):
         logger.error(f"Error in verify_data_integrity: {str(e)}")
         raise
 
-# ============================================
-# DAG TASKS
-# ============================================
+def export_analytics_snapshot(source, **context):
+    """
+    Snapshot the analytics tables into a local DuckDB file so the dashboard
+    can run its OLAP reads in-process instead of against PostgreSQL.
+    Rows are streamed from a server-side cursor in Arrow batches (no
+    intermediate files). The file is built under a temporary name and
+    swapped in atomically; every source's DAG exports the same snapshot,
+    serialized by snapshot_pool.
+    """
+    if duckdb is None:
+        raise AirflowSkipException("duckdb/pyarrow is not installed, skipping analytics snapshot")
 
-# Extract task
-extract_task = PythonOperator(
-    task_id='extract_pollution_data',
-    python_callable=extract_data,
-    dag=dag,
-)
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_snapshot_path = f"{ANALYTICS_SNAPSHOT_PATH}.{source['source_id']}.tmp"
+    if os.path.exists(tmp_snapshot_path):
+        os.remove(tmp_snapshot_path)
 
-# Load raw data task
-load_raw_task = PythonOperator(
-    task_id='load_raw_data',
-    python_callable=load_raw_data,
-    depends_on_past=False,
-    dag=dag,
-)
+    connection = None
+    snapshot = None
+    try:
+        hook = PostgresHook(postgres_conn_id=source['postgres_conn_id'])
+        connection = hook.get_conn()
+        snapshot = duckdb.connect(tmp_snapshot_path)
 
-# Transform and load analytics task
-transform_task = PythonOperator(
-    task_id='transform_and_load_analytics',
-    python_callable=transform_and_load_analytics,
-    depends_on_past=False,
-    dag=dag,
-)
+        exported = {}
+        for table in SNAPSHOT_TABLES:
+            cursor = connection.cursor()
+            cursor.execute("""
+                SELECT column_name, data_type
+                FROM information_schema.columns
+                WHERE table_name = %s
+                ORDER BY ordinal_position
+            """, (table,))
+            schema = pa.schema([
+                (name, pa.type_for_alias(ARROW_TYPES.get(data_type, 'string')))
+                for name, data_type in cursor.fetchall()
+            ])
+            cursor.close()
 
-# Verify data integrity task
-verify_task = PythonOperator(
-    task_id='verify_data_integrity',
-    python_callable=verify_data_integrity,
-    depends_on_past=False,
-    dag=dag,
-)
+            snapshot.register('arrow_batch', schema.empty_table())
+            snapshot.execute(f"CREATE TABLE {table} AS SELECT * FROM arrow_batch")
+            snapshot.unregister('arrow_batch')
+
+            # Named cursor: PostgreSQL sends the rows in chunks instead of all at once
+            cursor = connection.cursor(name=f"snapshot_{table}")
+            cursor.itersize = SNAPSHOT_CHUNK_ROWS
+            cursor.execute(f"SELECT {', '.join(schema.names)} FROM {table}")
+            exported[table] = 0
+            while True:
+                rows = cursor.fetchmany(SNAPSHOT_CHUNK_ROWS)
+                if not rows:
+                    break
+                batch = pa.Table.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(zip(*rows), schema)],
+                    schema=schema
+                )
+                snapshot.register('arrow_batch', batch)
+                snapshot.execute(f"INSERT INTO {table} SELECT * FROM arrow_batch")
+                snapshot.unregister('arrow_batch')
+                exported[table] += len(rows)
+            cursor.close()
+
+            logger.info(f"Snapshotted {exported[table]} rows from {table}")
+
+        snapshot.close()
+        snapshot = None
+        os.replace(tmp_snapshot_path, ANALYTICS_SNAPSHOT_PATH)
+        logger.info(f"Analytics snapshot written to {ANALYTICS_SNAPSHOT_PATH}")
+
+        return {
+            'status': 'success',
+            'snapshot_path': ANALYTICS_SNAPSHOT_PATH,
+            'tables': exported
+        }
+    except Exception as e:
+        logger.error(f"Error in export_analytics_snapshot: {str(e)}")
+        raise
+    finally:
+        if snapshot is not None:
+            snapshot.close()
+        if connection is not None:
+            connection.close()
+        # Only left behind when the export failed before the swap
+        if os.path.exists(tmp_snapshot_path):
+            os.remove(tmp_snapshot_path)
 
 # ============================================
-# DAG DEPENDENCIES (Pipeline Flow)
+# DAG FACTORY
 # ============================================
-extract_task >> load_raw_task >> transform_task >> verify_task
\ No newline at end of file
+
+def create_pipeline_dag(source):
+    """
+    Build the ELT DAG of one configured source. All its tasks run on the
+    source's Celery queue; the PostgreSQL-heavy ones share `pool` with the
+    other sources so parallel cities cannot overload the database.
+    """
+    dag = DAG(
+        source['dag_id'],
+        default_args={**default_args, 'queue': source['queue']},
+        description=f"ELT Pipeline for Air Pollution Data Analysis ({source.get('description', source['source_id'])})",
+        schedule_interval=source['schedule'],
+        catchup=False,
+        max_active_runs=1,
+        max_active_tasks=source['max_active_tasks'],
+        tags=['ELT', 'pollution', 'production', source['source_id']],
+    )
+
+    # ============================================
+    # DAG TASKS
+    # ============================================
+
+    # Extract task
+    extract_task = PythonOperator(
+        task_id='extract_pollution_data',
+        python_callable=extract_data,
+        op_kwargs={'source': source},
+        dag=dag,
+    )
+
+    # Load raw data task
+    load_raw_task = PythonOperator(
+        task_id='load_raw_data',
+        python_callable=load_raw_data,
+        op_kwargs={'source': source},
+        depends_on_past=False,
+        pool=source['pool'],
+        pool_slots=source['pool_slots'],
+        dag=dag,
+    )
+
+    # Transform and load analytics task
+    transform_task = PythonOperator(
+        task_id='transform_and_load_analytics',
+        python_callable=transform_and_load_analytics,
+        op_kwargs={'source': source},
+        depends_on_past=False,
+        pool=source['pool'],
+        pool_slots=source['pool_slots'],
+        dag=dag,
+    )
+
+    # Verify data integrity task
+    verify_task = PythonOperator(
+        task_id='verify_data_integrity',
+        python_callable=verify_data_integrity,
+        op_kwargs={'source': source},
+        depends_on_past=False,
+        pool=source['pool'],
+        pool_slots=source['pool_slots'],
+        dag=dag,
+    )
+
+    # Snapshot analytics tables for the dashboard (only after a verified run)
+    snapshot_task = PythonOperator(
+        task_id='export_analytics_snapshot',
+        python_callable=export_analytics_snapshot,
+        op_kwargs={'source': source},
+        depends_on_past=False,
+        pool=source['snapshot_pool'],
+        dag=dag,
+    )
+
+    # ============================================
+    # DAG DEPENDENCIES (Pipeline Flow)
+    # ============================================
+    extract_task >> load_raw_task >> transform_task >> verify_task >> snapshot_task
+
+    return dag
+
+# One DAG per configured source, registered at module level for the scheduler
+for pipeline_source in load_pipeline_sources():
+    globals()[pipeline_source['dag_id']] = create_pipeline_dag(pipeline_source)
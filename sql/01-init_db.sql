@@ -5,6 +5,7 @@
 -- Create raw data table (IMMUTABLE)
 CREATE TABLE IF NOT EXISTS raw_data_pollution (
     id BIGSERIAL PRIMARY KEY,
+    source_id VARCHAR(50),
     measurement_date TIMESTAMP,
     station_code VARCHAR(50),
     station_name VARCHAR(255),
@@ -23,17 +24,35 @@ CREATE TABLE IF NOT EXISTS raw_data_pollution (
     measurement_info TEXT,
     original_row_data JSONB,
     loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    CONSTRAINT unique_raw_entry UNIQUE (measurement_date, station_code, so2, no2, o3, co, pm10, pm25)
+    CONSTRAINT unique_raw_entry UNIQUE (source_id, measurement_date, station_code, so2, no2, o3, co, pm10, pm25)
 );
 
 -- Create indexes on raw table for fast lookups
 CREATE INDEX idx_raw_measurement_date ON raw_data_pollution(measurement_date);
 CREATE INDEX idx_raw_station_code ON raw_data_pollution(station_code);
 CREATE INDEX idx_raw_loaded_at ON raw_data_pollution(loaded_at);
+CREATE INDEX idx_raw_source_loaded_at ON raw_data_pollution(source_id, loaded_at);
+
+-- Create quarantine table for raw rows rejected by validation
+CREATE TABLE IF NOT EXISTS quarantine_raw_pollution (
+    id BIGSERIAL PRIMARY KEY,
+    dag_run_id VARCHAR(255),
+    source_file TEXT,
+    source_row_number INTEGER,
+    reason_codes TEXT,
+    original_row_data JSONB,
+    quarantined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create indexes on quarantine table (a rejected row is quarantined once per source file)
+CREATE INDEX idx_quarantine_dag_run ON quarantine_raw_pollution(dag_run_id);
+CREATE UNIQUE INDEX idx_quarantine_unique_row ON quarantine_raw_pollution(source_file, md5(original_row_data::text));
 
 -- Create analytics table (TRANSFORMATIONS RESULT)
 CREATE TABLE IF NOT EXISTS analytics_pollution (
     id BIGSERIAL PRIMARY KEY,
+    raw_id BIGINT,
+    source_id VARCHAR(50),
     measurement_date DATE,
     station_code VARCHAR(50),
     station_name VARCHAR(255),
@@ -54,10 +73,12 @@ CREATE TABLE IF NOT EXISTS analytics_pollution (
 CREATE INDEX idx_analytics_date ON analytics_pollution(measurement_date);
 CREATE INDEX idx_analytics_station ON analytics_pollution(station_code);
 CREATE INDEX idx_analytics_aqi ON analytics_pollution(air_quality_index);
+CREATE INDEX idx_analytics_source_station ON analytics_pollution(source_id, station_code, hourly_timestamp);
 
 -- Create materialized view for daily aggregations
 CREATE TABLE IF NOT EXISTS daily_aggregations_pollution (
     id BIGSERIAL PRIMARY KEY,
+    source_id VARCHAR(50),
     aggregation_date DATE,
     station_code VARCHAR(50),
     station_name VARCHAR(255),
@@ -71,13 +92,58 @@ CREATE TABLE IF NOT EXISTS daily_aggregations_pollution (
     min_aqi FLOAT,
     avg_aqi FLOAT,
     records_count INTEGER,
-    aggregated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    aggregated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT unique_daily_aggregation UNIQUE (source_id, aggregation_date, station_code)
 );
 
 -- Create indexes on daily aggregations
 CREATE INDEX idx_daily_agg_date ON daily_aggregations_pollution(aggregation_date);
 CREATE INDEX idx_daily_agg_station ON daily_aggregations_pollution(station_code);
 
+-- Create rolling-window metrics table (24h average and NowCast PM2.5 per station-hour)
+CREATE TABLE IF NOT EXISTS rolling_metrics_pollution (
+    source_id VARCHAR(50),
+    station_code VARCHAR(50),
+    hourly_timestamp TIMESTAMP,
+    pm25_avg_24h FLOAT,
+    pm25_nowcast FLOAT,
+    nowcast_aqi FLOAT,
+    nowcast_category VARCHAR(50),
+    hours_in_window INTEGER,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source_id, station_code, hourly_timestamp)
+);
+
+-- Create index on rolling metrics
+CREATE INDEX idx_rolling_hourly_timestamp ON rolling_metrics_pollution(hourly_timestamp);
+
+-- Create rolling window state (trailing 24 hourly PM2.5 values carried between runs)
+CREATE TABLE IF NOT EXISTS rolling_window_state (
+    source_id VARCHAR(50),
+    station_code VARCHAR(50),
+    last_hour TIMESTAMP,
+    pm25_window FLOAT[],
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source_id, station_code)
+);
+
+-- Create streaming statistics per station and pollutant (used for quality flags)
+CREATE TABLE IF NOT EXISTS station_pollutant_stats (
+    source_id VARCHAR(50),
+    station_code VARCHAR(50),
+    pollutant VARCHAR(10),
+    sample_count BIGINT,
+    running_mean FLOAT,
+    running_m2 FLOAT,
+    last_value FLOAT,
+    last_timestamp TIMESTAMP,
+    repeat_value FLOAT,
+    repeat_count INTEGER,
+    quantile_sketch BIGINT[],
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source_id, station_code, pollutant)
+);
+
 -- Create audit table for tracking ELT runs
 CREATE TABLE IF NOT EXISTS elt_audit_log (
     id BIGSERIAL PRIMARY KEY,
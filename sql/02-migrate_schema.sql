@@ -0,0 +1,173 @@
+-- ============================================
+-- SCHEMA MIGRATION FOR EXISTING DEPLOYMENTS
+-- ============================================
+-- 01-init_db.sql only runs on an empty Postgres volume. This script brings a
+-- database created by an older version up to the current schema and is safe
+-- to run on every start (docker-compose runs it before the webserver).
+-- Rows loaded before pipelines were configured per source all come from the
+-- original Seoul pipeline, so they are backfilled with source_id = 'seoul'.
+
+-- Raw table: source_id, and the duplicate check scoped by source
+ALTER TABLE raw_data_pollution ADD COLUMN IF NOT EXISTS source_id VARCHAR(50);
+UPDATE raw_data_pollution SET source_id = 'seoul' WHERE source_id IS NULL;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conname = 'unique_raw_entry'
+        AND pg_get_constraintdef(oid) LIKE '%source_id%'
+    ) THEN
+        ALTER TABLE raw_data_pollution DROP CONSTRAINT IF EXISTS unique_raw_entry;
+        ALTER TABLE raw_data_pollution ADD CONSTRAINT unique_raw_entry
+            UNIQUE (source_id, measurement_date, station_code, so2, no2, o3, co, pm10, pm25);
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_raw_source_loaded_at ON raw_data_pollution(source_id, loaded_at);
+
+-- Quarantine table (a rejected row is quarantined once per source file)
+CREATE TABLE IF NOT EXISTS quarantine_raw_pollution (
+    id BIGSERIAL PRIMARY KEY,
+    dag_run_id VARCHAR(255),
+    source_file TEXT,
+    source_row_number INTEGER,
+    reason_codes TEXT,
+    original_row_data JSONB,
+    quarantined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_quarantine_dag_run ON quarantine_raw_pollution(dag_run_id);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'idx_quarantine_unique_row') THEN
+        -- Earlier versions re-quarantined the same rows on every run
+        DELETE FROM quarantine_raw_pollution q
+        USING quarantine_raw_pollution newer
+        WHERE q.source_file = newer.source_file
+        AND md5(q.original_row_data::text) = md5(newer.original_row_data::text)
+        AND q.id > newer.id;
+
+        CREATE UNIQUE INDEX idx_quarantine_unique_row
+            ON quarantine_raw_pollution(source_file, md5(original_row_data::text));
+    END IF;
+END $$;
+
+-- Analytics table: lineage to the raw row and source_id
+ALTER TABLE analytics_pollution ADD COLUMN IF NOT EXISTS raw_id BIGINT;
+ALTER TABLE analytics_pollution ADD COLUMN IF NOT EXISTS source_id VARCHAR(50);
+UPDATE analytics_pollution SET source_id = 'seoul' WHERE source_id IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_analytics_source_station ON analytics_pollution(source_id, station_code, hourly_timestamp);
+
+-- Daily aggregations: source_id and one row per station-day (keep the newest duplicate)
+ALTER TABLE daily_aggregations_pollution ADD COLUMN IF NOT EXISTS source_id VARCHAR(50);
+UPDATE daily_aggregations_pollution SET source_id = 'seoul' WHERE source_id IS NULL;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'unique_daily_aggregation') THEN
+        DELETE FROM daily_aggregations_pollution d
+        USING daily_aggregations_pollution newer
+        WHERE d.source_id = newer.source_id
+        AND d.aggregation_date = newer.aggregation_date
+        AND d.station_code = newer.station_code
+        AND d.id < newer.id;
+
+        ALTER TABLE daily_aggregations_pollution ADD CONSTRAINT unique_daily_aggregation
+            UNIQUE (source_id, aggregation_date, station_code);
+    END IF;
+END $$;
+
+-- Rolling-window metrics, keyed by source
+CREATE TABLE IF NOT EXISTS rolling_metrics_pollution (
+    source_id VARCHAR(50),
+    station_code VARCHAR(50),
+    hourly_timestamp TIMESTAMP,
+    pm25_avg_24h FLOAT,
+    pm25_nowcast FLOAT,
+    nowcast_aqi FLOAT,
+    nowcast_category VARCHAR(50),
+    hours_in_window INTEGER,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source_id, station_code, hourly_timestamp)
+);
+
+ALTER TABLE rolling_metrics_pollution ADD COLUMN IF NOT EXISTS source_id VARCHAR(50);
+UPDATE rolling_metrics_pollution SET source_id = 'seoul' WHERE source_id IS NULL;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conname = 'rolling_metrics_pollution_pkey'
+        AND pg_get_constraintdef(oid) LIKE '%source_id%'
+    ) THEN
+        ALTER TABLE rolling_metrics_pollution DROP CONSTRAINT IF EXISTS rolling_metrics_pollution_pkey;
+        ALTER TABLE rolling_metrics_pollution ADD CONSTRAINT rolling_metrics_pollution_pkey
+            PRIMARY KEY (source_id, station_code, hourly_timestamp);
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_rolling_hourly_timestamp ON rolling_metrics_pollution(hourly_timestamp);
+
+-- Rolling window state, keyed by source
+CREATE TABLE IF NOT EXISTS rolling_window_state (
+    source_id VARCHAR(50),
+    station_code VARCHAR(50),
+    last_hour TIMESTAMP,
+    pm25_window FLOAT[],
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source_id, station_code)
+);
+
+ALTER TABLE rolling_window_state ADD COLUMN IF NOT EXISTS source_id VARCHAR(50);
+UPDATE rolling_window_state SET source_id = 'seoul' WHERE source_id IS NULL;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conname = 'rolling_window_state_pkey'
+        AND pg_get_constraintdef(oid) LIKE '%source_id%'
+    ) THEN
+        ALTER TABLE rolling_window_state DROP CONSTRAINT IF EXISTS rolling_window_state_pkey;
+        ALTER TABLE rolling_window_state ADD CONSTRAINT rolling_window_state_pkey
+            PRIMARY KEY (source_id, station_code);
+    END IF;
+END $$;
+
+-- Streaming statistics per station and pollutant, keyed by source
+CREATE TABLE IF NOT EXISTS station_pollutant_stats (
+    source_id VARCHAR(50),
+    station_code VARCHAR(50),
+    pollutant VARCHAR(10),
+    sample_count BIGINT,
+    running_mean FLOAT,
+    running_m2 FLOAT,
+    last_value FLOAT,
+    last_timestamp TIMESTAMP,
+    repeat_value FLOAT,
+    repeat_count INTEGER,
+    quantile_sketch BIGINT[],
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source_id, station_code, pollutant)
+);
+
+ALTER TABLE station_pollutant_stats ADD COLUMN IF NOT EXISTS source_id VARCHAR(50);
+ALTER TABLE station_pollutant_stats ADD COLUMN IF NOT EXISTS repeat_value FLOAT;
+UPDATE station_pollutant_stats SET source_id = 'seoul' WHERE source_id IS NULL;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conname = 'station_pollutant_stats_pkey'
+        AND pg_get_constraintdef(oid) LIKE '%source_id%'
+    ) THEN
+        ALTER TABLE station_pollutant_stats DROP CONSTRAINT IF EXISTS station_pollutant_stats_pkey;
+        ALTER TABLE station_pollutant_stats ADD CONSTRAINT station_pollutant_stats_pkey
+            PRIMARY KEY (source_id, station_code, pollutant);
+    END IF;
+END $$;
@@ -8,13 +8,42 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 import psycopg2
+import psycopg2.errors
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 import logging
+import os
+import threading
+
+try:
+    import duckdb
+except ImportError:  # the DuckDB snapshot backend is optional
+    duckdb = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Read backend: "postgres" (default) or "duckdb" to query the local snapshot
+# written by the DAG's export_analytics_snapshot task
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "postgres").lower()
+ANALYTICS_SNAPSHOT_PATH = os.getenv("ANALYTICS_SNAPSHOT_PATH", "data/snapshots/analytics.duckdb")
+
+# Concurrent dashboard queries across all sessions (worker threads == pooled connections)
+QUERY_WORKERS = int(os.getenv("DASHBOARD_QUERY_WORKERS", "20"))
+# Queries a single browser session may have running at once; the rest of its
+# queries wait in that session's own queue, so one user cannot take every worker
+SESSION_QUERY_LIMIT = int(os.getenv("DASHBOARD_SESSION_QUERY_LIMIT", "3"))
+
+# Per-query time budget; slow sections fall back to daily_aggregations_pollution
+QUERY_TIMEOUT_MS = int(os.getenv("DASHBOARD_QUERY_TIMEOUT_MS", "5000"))
+
+# Max points sent to the browser for the time-series chart
+# (roughly one point per horizontal pixel of a wide-layout chart)
+TIMESERIES_POINT_BUDGET = int(os.getenv("DASHBOARD_TIMESERIES_POINT_BUDGET", "1500"))
+
 # ============================================
 # PAGE CONFIGURATION
 # ============================================
@@ -30,10 +59,12 @@ st.set_page_config(
 # ============================================
 
 @st.cache_resource
-def get_db_connection():
-    """Create and cache database connection"""
+def get_db_pool():
+    """Create and cache a thread-safe pool of database connections"""
     try:
-        conn = psycopg2.connect(
+        db_pool = ThreadedConnectionPool(
+            minconn=1,
+            maxconn=QUERY_WORKERS,
             host="postgres",
             database="pollution_db",
             user="airflow",
@@ -41,38 +72,236 @@ def get_db_connection():
             port=5432
         )
         logger.info("Connected to PostgreSQL")
-        return conn
+        return db_pool
     except Exception as e:
         logger.error(f"Database connection error: {str(e)}")
         st.error(f"❌ Cannot connect to database: {str(e)}")
         return None
 
-def query_analytics_data(query, params=None):
-    """Execute query and return dataframe"""
+@st.cache_resource
+def get_query_executor():
+    """
+    Shared worker threads for dashboard queries. Sized like the connection
+    pool so a worker never waits for a free connection.
+    """
+    return ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="dashboard-query")
+
+class SessionQueryDispatcher:
+    """
+    Per-session front of the shared executor: at most SESSION_QUERY_LIMIT of
+    the session's queries are handed to the executor at a time, the others
+    are queued here and started as earlier ones finish.
+    """
+
+    def __init__(self, executor, limit):
+        self._executor = executor
+        self._limit = limit
+        self._lock = threading.Lock()
+        self._queued = deque()
+        self._running = 0
+
+    def submit(self, fn, *args):
+        future = Future()
+        with self._lock:
+            if self._running >= self._limit:
+                self._queued.append((future, fn, args))
+                return future
+            self._running += 1
+        self._start(future, fn, args)
+        return future
+
+    def _start(self, future, fn, args):
+        inner = self._executor.submit(fn, *args)
+        inner.add_done_callback(lambda done: self._finish(done, future))
+
+    def _finish(self, done, future):
+        if done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result())
+        with self._lock:
+            if not self._queued:
+                self._running -= 1
+                return
+            next_future, fn, args = self._queued.popleft()
+        self._start(next_future, fn, args)
+
+def get_session_dispatcher():
+    """This browser session's query dispatcher"""
+    if 'query_dispatcher' not in st.session_state:
+        st.session_state['query_dispatcher'] = SessionQueryDispatcher(get_query_executor(), SESSION_QUERY_LIMIT)
+    return st.session_state['query_dispatcher']
+
+@st.cache_resource(max_entries=1)
+def get_snapshot_connection(snapshot_mtime):
+    """Open the DuckDB snapshot read-only (re-opened whenever the file changes)"""
+    logger.info(f"Opened analytics snapshot {ANALYTICS_SNAPSHOT_PATH} (mtime {snapshot_mtime})")
+    return duckdb.connect(ANALYTICS_SNAPSHOT_PATH, read_only=True)
+
+def snapshot_mtime():
+    """Modification time of the DuckDB snapshot, or None if it cannot be used"""
+    if ANALYTICS_BACKEND != "duckdb":
+        return None
+    if duckdb is None:
+        logger.warning("ANALYTICS_BACKEND=duckdb but duckdb is not installed, using PostgreSQL")
+        return None
+    if not os.path.exists(ANALYTICS_SNAPSHOT_PATH):
+        logger.warning(f"Snapshot {ANALYTICS_SNAPSHOT_PATH} not found, using PostgreSQL")
+        return None
+    return os.path.getmtime(ANALYTICS_SNAPSHOT_PATH)
+
+class QueryTimeout(Exception):
+    """A dashboard query ran past DASHBOARD_QUERY_TIMEOUT_MS"""
+
+class QueryBatch:
+    """
+    In-flight queries of one script run. A rerun cancels the previous run's
+    batch so its queries stop on the server instead of piling up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancel_callbacks = {}
+        self.cancelled = False
+
+    def register(self, key, cancel):
+        with self._lock:
+            if self.cancelled:
+                cancel()
+            self._cancel_callbacks[key] = cancel
+
+    def unregister(self, key):
+        with self._lock:
+            self._cancel_callbacks.pop(key, None)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            callbacks = list(self._cancel_callbacks.values())
+            self._cancel_callbacks.clear()
+        for cancel in callbacks:
+            try:
+                cancel()
+            except Exception as e:
+                logger.warning(f"Could not cancel query: {str(e)}")
+        if callbacks:
+            logger.info(f"Cancelled {len(callbacks)} in-flight queries from a previous run")
+
+def execute_query(query, params, db_pool, snapshot_conn, batch):
+    """
+    Run one query and return a dataframe. Runs on a worker thread, so it
+    must not call Streamlit; errors are raised to the caller.
+    Raises QueryTimeout when the query exceeds the time budget.
+    """
+    if batch.cancelled:
+        return pd.DataFrame()
+
+    if snapshot_conn is not None:
+        cursor = snapshot_conn.cursor()
+        # DuckDB has no statement_timeout, interrupt it from a timer instead
+        timer = threading.Timer(QUERY_TIMEOUT_MS / 1000, cursor.interrupt)
+        batch.register(id(cursor), cursor.interrupt)
+        timer.start()
+        try:
+            # Cancelled between the first check and register(): nothing was sent yet
+            if batch.cancelled:
+                return pd.DataFrame()
+            return cursor.execute(query.replace('%s', '?'), params or []).df()
+        except Exception:
+            if timer.finished.is_set() and not batch.cancelled:
+                raise QueryTimeout(f"query exceeded {QUERY_TIMEOUT_MS} ms")
+            raise
+        finally:
+            timer.cancel()
+            batch.unregister(id(cursor))
+            cursor.close()
+
+    if db_pool is None:
+        return pd.DataFrame()
+
+    conn = db_pool.getconn()
+    batch.register(id(conn), conn.cancel)
     try:
-        conn = get_db_connection()
-        if conn is None:
+        # conn.cancel() only stops a statement already on the server, so a
+        # cancel that arrived before this point has to be honoured here
+        if batch.cancelled:
             return pd.DataFrame()
-        
         cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("SET LOCAL statement_timeout = %s", (QUERY_TIMEOUT_MS,))
         cursor.execute(query, params)
         data = cursor.fetchall()
         cursor.close()
-        
+
         if data:
             return pd.DataFrame(data)
         return pd.DataFrame()
+    except psycopg2.errors.QueryCanceled:
+        if batch.cancelled:
+            return pd.DataFrame()
+        raise QueryTimeout(f"query exceeded {QUERY_TIMEOUT_MS} ms")
+    finally:
+        batch.unregister(id(conn))
+        # Read-only queries: end the transaction so the connection goes back clean
+        if not conn.closed:
+            conn.rollback()
+        db_pool.putconn(conn, close=bool(conn.closed))
+
+def execute_with_fallback(query, params, fallback, db_pool, snapshot_conn, batch):
+    """
+    Run a query; if it times out and a coarser (query, params) fallback is
+    given, answer from that instead. Returns (dataframe, used_fallback).
+    """
+    try:
+        return execute_query(query, params, db_pool, snapshot_conn, batch), False
+    except QueryTimeout:
+        if fallback is None:
+            raise
+        logger.warning(f"Query timed out after {QUERY_TIMEOUT_MS} ms, using pre-aggregated fallback")
+        fallback_query, fallback_params = fallback
+        return execute_query(fallback_query, fallback_params, db_pool, snapshot_conn, batch), True
+
+def submit_query(query, params=None, fallback=None):
+    """Dispatch a query through this session's dispatcher and return its future"""
+    mtime = snapshot_mtime()
+    snapshot_conn = get_snapshot_connection(mtime) if mtime is not None else None
+    db_pool = get_db_pool() if snapshot_conn is None else None
+    batch = st.session_state['query_batch']
+    return get_session_dispatcher().submit(
+        execute_with_fallback, query, params, fallback, db_pool, snapshot_conn, batch
+    )
+
+def query_analytics_data(query, params=None):
+    """Execute query and return dataframe"""
+    try:
+        return submit_query(query, params).result()[0]
     except Exception as e:
         logger.error(f"Query error: {str(e)}")
         st.error(f"Query failed: {str(e)}")
         return pd.DataFrame()
 
+def compute_bucket_width(start_date, end_date, series_count, point_budget, steps_per_day=1):
+    """
+    Width (in steps, days by default) of the time buckets needed so that every
+    plotted series fits in the point budget. 1 means no downsampling.
+    """
+    total_steps = ((end_date - start_date).days + 1) * steps_per_day
+    total_points = total_steps * max(series_count, 1)
+    return max(1, -(-total_points // point_budget))
+
 # ============================================
 # DASHBOARD LAYOUT
 # ============================================
 
+# Each rerun (e.g. a filter change) cancels whatever the previous run of this
+# session still has in flight before dispatching its own queries
+previous_batch = st.session_state.get('query_batch')
+if previous_batch is not None:
+    previous_batch.cancel()
+st.session_state['query_batch'] = QueryBatch()
+
 st.title("🌍 Air Pollution Analysis Dashboard")
 st.markdown("**ELT Pipeline Output** - Real-time Air Quality Monitoring")
+loading_status = st.empty()
 
 # Sidebar filters
 st.sidebar.header("📊 Filters")
@@ -86,12 +315,13 @@ date_range = st.sidebar.date_input(
 
 # Station selector
 with st.spinner("Loading stations..."):
-    stations_query = "SELECT DISTINCT station_code, station_name FROM analytics_pollution ORDER BY station_name"
+    # Station codes are only unique within a monitoring network (source_id)
+    stations_query = "SELECT DISTINCT source_id, station_code, station_name FROM analytics_pollution ORDER BY station_name"
     stations_df = query_analytics_data(stations_query)
     
     if not stations_df.empty:
         station_options = {
-            f"{row['station_name']} ({row['station_code']})": row['station_code']
+            f"{row['station_name']} ({row['station_code']}, {row['source_id']})": (row['source_id'], row['station_code'])
             for _, row in stations_df.iterrows()
         }
         selected_station_display = st.sidebar.selectbox(
@@ -105,10 +335,11 @@ with st.spinner("Loading stations..."):
         selected_station = None
 
 # Pollution level filter
+all_pollution_categories = ['Good', 'Moderate', 'Unhealthy for Sensitive Groups', 'Unhealthy', 'Very Unhealthy', 'Hazardous']
 pollution_categories = st.sidebar.multiselect(
     "Filter by Air Quality",
-    options=['Good', 'Moderate', 'Unhealthy for Sensitive Groups', 'Unhealthy', 'Very Unhealthy', 'Hazardous'],
-    default=['Good', 'Moderate', 'Unhealthy for Sensitive Groups', 'Unhealthy', 'Very Unhealthy', 'Hazardous']
+    options=all_pollution_categories,
+    default=all_pollution_categories
 )
 
 st.sidebar.markdown("---")
@@ -118,13 +349,43 @@ st.sidebar.info(
     "generated by the ELT pipeline. Data is automatically refreshed when the Airflow DAG runs."
 )
 
+current_snapshot_mtime = snapshot_mtime()
+if current_snapshot_mtime is not None:
+    st.sidebar.caption(
+        f"⚡ Reading from local snapshot "
+        f"(taken {datetime.fromtimestamp(current_snapshot_mtime).strftime('%Y-%m-%d %H:%M')})"
+    )
+
 # ============================================
 # KEY METRICS
 # ============================================
 
+# Every section below only builds its query and reserves its place on the
+# page. The queries are then dispatched together and each section renders
+# as soon as its own result arrives (see "RENDER RESULTS" at the bottom).
+dashboard_sections = []
+
+def add_section(name, query, params, render, fallback=None):
+    """
+    Register a query and the function that draws its result. `fallback` is an
+    optional (query, params) over daily_aggregations_pollution used when the
+    query exceeds the time budget; it must return the same columns.
+    """
+    dashboard_sections.append({
+        'name': name,
+        'query': query,
+        'params': params,
+        'render': render,
+        'fallback': fallback,
+        'notice': st.empty(),
+    })
+
 st.markdown("## 📈 Key Metrics")
 
 col1, col2, col3, col4 = st.columns(4)
+kpi_placeholders = [col.empty() for col in (col1, col2, col3, col4)]
+for placeholder in kpi_placeholders:
+    placeholder.caption("⏳ Loading...")
 
 # Build query for KPIs
 kpi_query = """
@@ -141,38 +402,58 @@ kpi_query = """
 params = [date_range[0], date_range[1]]
 
 if selected_station:
-    kpi_query += " AND station_code = %s"
-    params.append(selected_station)
+    kpi_query += " AND source_id = %s AND station_code = %s"
+    params.extend(selected_station)
 
 if pollution_categories:
     placeholders = ','.join(['%s'] * len(pollution_categories))
     kpi_query += f" AND pollution_category IN ({placeholders})"
     params.extend(pollution_categories)
 
-kpi_df = query_analytics_data(kpi_query, params)
-
-if not kpi_df.empty and len(kpi_df) > 0:
-    row = kpi_df.iloc[0]
-    
-    with col1:
-        st.metric("Total Records", f"{row.get('total_records', 0):,}")
-    
-    with col2:
+def render_kpis(kpi_df):
+    """Fill the four KPI columns"""
+    if not kpi_df.empty and len(kpi_df) > 0:
+        row = kpi_df.iloc[0]
+        
+        kpi_placeholders[0].metric("Total Records", f"{row.get('total_records', 0):,}")
+        
         avg_aqi = row.get('avg_aqi', 0)
-        st.metric("Average AQI", f"{avg_aqi:.2f}")
-    
-    with col3:
+        kpi_placeholders[1].metric("Average AQI", f"{avg_aqi:.2f}")
+        
         max_aqi = row.get('max_aqi', 0)
-        st.metric("Max AQI", f"{max_aqi:.2f}")
-    
-    with col4:
+        kpi_placeholders[2].metric("Max AQI", f"{max_aqi:.2f}")
+        
         avg_pm25 = row.get('avg_pm25', 0)
-        st.metric("Avg PM2.5 (μg/m³)", f"{avg_pm25:.2f}")
-else:
-    col1.metric("Total Records", "0")
-    col2.metric("Average AQI", "N/A")
-    col3.metric("Max AQI", "N/A")
-    col4.metric("Avg PM2.5 (μg/m³)", "N/A")
+        kpi_placeholders[3].metric("Avg PM2.5 (μg/m³)", f"{avg_pm25:.2f}")
+    else:
+        kpi_placeholders[0].metric("Total Records", "0")
+        kpi_placeholders[1].metric("Average AQI", "N/A")
+        kpi_placeholders[2].metric("Max AQI", "N/A")
+        kpi_placeholders[3].metric("Avg PM2.5 (μg/m³)", "N/A")
+
+# Coarser answer from the daily aggregates. They have no per-category
+# breakdown, so it is only offered when the category filter keeps everything.
+kpi_fallback_query = """
+    SELECT 
+        COALESCE(SUM(records_count), 0) as total_records,
+        ROUND((SUM(avg_aqi * records_count) / NULLIF(SUM(records_count), 0))::numeric, 2) as avg_aqi,
+        ROUND(MAX(max_aqi)::numeric, 2) as max_aqi,
+        ROUND((SUM(avg_pm25 * records_count) / NULLIF(SUM(records_count), 0))::numeric, 2) as avg_pm25
+    FROM daily_aggregations_pollution
+    WHERE aggregation_date >= %s 
+    AND aggregation_date <= %s
+"""
+
+fallback_params = [date_range[0], date_range[1]]
+
+if selected_station:
+    kpi_fallback_query += " AND source_id = %s AND station_code = %s"
+    fallback_params.extend(selected_station)
+
+category_filter_narrows = bool(pollution_categories) and set(pollution_categories) != set(all_pollution_categories)
+kpi_fallback = None if category_filter_narrows else (kpi_fallback_query, fallback_params)
+
+add_section('kpis', kpi_query, params, render_kpis, fallback=kpi_fallback)
 
 st.markdown("---")
 
@@ -184,14 +465,23 @@ st.markdown("## 📊 Visualizations")
 
 # Chart 1: PM2.5 Time Series
 st.markdown("### PM2.5 Concentration Over Time")
+timeseries_placeholder = st.empty()
+timeseries_placeholder.caption("⏳ Loading...")
+
+# Downsample long ranges server-side: days are grouped into fixed-width buckets
+# so the chart never receives more than TIMESERIES_POINT_BUDGET points.
+# MAX/MIN are taken over the whole bucket, so peaks stay visible. With
+# "All Stations" the stations of each network are combined into one series.
+series_count = 1 if selected_station or stations_df.empty else stations_df['source_id'].nunique()
+bucket_days = compute_bucket_width(date_range[0], date_range[1], series_count, TIMESERIES_POINT_BUDGET)
 
 timeseries_query = """
     SELECT 
-        measurement_date,
+        MIN(measurement_date) as measurement_date,
         ROUND(AVG(pm25_clean)::numeric, 2) as avg_pm25,
         ROUND(MAX(pm25_clean)::numeric, 2) as max_pm25,
         ROUND(MIN(pm25_clean)::numeric, 2) as min_pm25,
-        station_code
+        source_id
     FROM analytics_pollution
     WHERE measurement_date >= %s 
     AND measurement_date <= %s
@@ -200,35 +490,134 @@ timeseries_query = """
 params = [date_range[0], date_range[1]]
 
 if selected_station:
-    timeseries_query += " AND station_code = %s"
-    params.append(selected_station)
-
-timeseries_query += " GROUP BY measurement_date, station_code ORDER BY measurement_date"
-
-timeseries_df = query_analytics_data(timeseries_query, params)
-
-if not timeseries_df.empty:
-    fig_pm25 = px.line(
-        timeseries_df,
-        x='measurement_date',
-        y=['avg_pm25', 'max_pm25', 'min_pm25'],
-        title='PM2.5 Trends',
-        labels={'measurement_date': 'Date', 'value': 'Concentration (μg/m³)'},
-        color_discrete_map={
-            'avg_pm25': '#1f77b4',
-            'max_pm25': '#ff7f0e',
-            'min_pm25': '#2ca02c'
-        }
-    )
-    fig_pm25.update_layout(hovermode='x unified', height=400)
-    st.plotly_chart(fig_pm25, use_container_width=True)
-else:
-    st.info("No data available for the selected filters")
+    timeseries_query += " AND source_id = %s AND station_code = %s"
+    params.extend(selected_station)
+
+timeseries_query += " GROUP BY FLOOR((measurement_date - %s::date) / %s), source_id ORDER BY measurement_date"
+params.extend([date_range[0], bucket_days])
+
+def render_timeseries(timeseries_df):
+    """Draw the PM2.5 trend chart"""
+    if not timeseries_df.empty:
+        # One line per metric; networks are told apart by dash style
+        timeseries_long = timeseries_df.melt(
+            id_vars=['measurement_date', 'source_id'],
+            value_vars=['avg_pm25', 'max_pm25', 'min_pm25']
+        )
+        fig_pm25 = px.line(
+            timeseries_long,
+            x='measurement_date',
+            y='value',
+            color='variable',
+            line_dash='source_id' if timeseries_long['source_id'].nunique() > 1 else None,
+            title='PM2.5 Trends',
+            labels={'measurement_date': 'Date', 'value': 'Concentration (μg/m³)'},
+            color_discrete_map={
+                'avg_pm25': '#1f77b4',
+                'max_pm25': '#ff7f0e',
+                'min_pm25': '#2ca02c'
+            }
+        )
+        fig_pm25.update_layout(hovermode='x unified', height=400)
+        with timeseries_placeholder.container():
+            st.plotly_chart(fig_pm25, use_container_width=True)
+            if bucket_days > 1:
+                st.caption(f"Downsampled to {bucket_days}-day buckets (min/max preserved) for the selected range")
+    else:
+        timeseries_placeholder.info("No data available for the selected filters")
+
+# Coarser answer from the daily aggregates: min/max are taken over daily
+# averages because the aggregates do not keep hourly extremes
+timeseries_fallback_query = """
+    SELECT 
+        MIN(aggregation_date) as measurement_date,
+        ROUND(AVG(avg_pm25)::numeric, 2) as avg_pm25,
+        ROUND(MAX(avg_pm25)::numeric, 2) as max_pm25,
+        ROUND(MIN(avg_pm25)::numeric, 2) as min_pm25,
+        source_id
+    FROM daily_aggregations_pollution
+    WHERE aggregation_date >= %s 
+    AND aggregation_date <= %s
+"""
+
+fallback_params = [date_range[0], date_range[1]]
+
+if selected_station:
+    timeseries_fallback_query += " AND source_id = %s AND station_code = %s"
+    fallback_params.extend(selected_station)
+
+timeseries_fallback_query += " GROUP BY FLOOR((aggregation_date - %s::date) / %s), source_id ORDER BY measurement_date"
+fallback_params.extend([date_range[0], bucket_days])
+
+add_section('timeseries', timeseries_query, params, render_timeseries,
+            fallback=(timeseries_fallback_query, fallback_params))
+
+# Chart 1b: Rolling 24h average and NowCast (precomputed by the transform step)
+st.markdown("### Rolling 24h Average & NowCast PM2.5")
+rolling_placeholder = st.empty()
+rolling_placeholder.caption("⏳ Loading...")
+
+# Hourly resolution, downsampled like the chart above; with "All Stations"
+# the stations of each network are averaged into one city-wide series
+bucket_hours = compute_bucket_width(date_range[0], date_range[1], series_count, TIMESERIES_POINT_BUDGET, steps_per_day=24)
+
+rolling_query = """
+    SELECT 
+        MIN(hourly_timestamp) as hourly_timestamp,
+        ROUND(AVG(pm25_avg_24h)::numeric, 2) as pm25_avg_24h,
+        ROUND(AVG(pm25_nowcast)::numeric, 2) as pm25_nowcast,
+        ROUND(MAX(pm25_nowcast)::numeric, 2) as max_pm25_nowcast,
+        source_id
+    FROM rolling_metrics_pollution
+    WHERE hourly_timestamp >= %s 
+    AND hourly_timestamp < %s
+"""
+
+params = [date_range[0], date_range[1] + timedelta(days=1)]
+
+if selected_station:
+    rolling_query += " AND source_id = %s AND station_code = %s"
+    params.extend(selected_station)
+
+rolling_query += " GROUP BY FLOOR(EXTRACT(EPOCH FROM (hourly_timestamp - %s::timestamp)) / %s), source_id ORDER BY hourly_timestamp"
+params.extend([date_range[0], bucket_hours * 3600])
+
+def render_rolling(rolling_df):
+    """Draw the 24h rolling average and NowCast chart"""
+    if not rolling_df.empty:
+        rolling_long = rolling_df.melt(
+            id_vars=['hourly_timestamp', 'source_id'],
+            value_vars=['pm25_avg_24h', 'pm25_nowcast', 'max_pm25_nowcast']
+        )
+        fig_rolling = px.line(
+            rolling_long,
+            x='hourly_timestamp',
+            y='value',
+            color='variable',
+            line_dash='source_id' if rolling_long['source_id'].nunique() > 1 else None,
+            title='24h Rolling Average vs NowCast',
+            labels={'hourly_timestamp': 'Hour', 'value': 'Concentration (μg/m³)'},
+            color_discrete_map={
+                'pm25_avg_24h': '#1f77b4',
+                'pm25_nowcast': '#d62728',
+                'max_pm25_nowcast': '#ff7f0e'
+            }
+        )
+        fig_rolling.update_layout(hovermode='x unified', height=400)
+        rolling_placeholder.plotly_chart(fig_rolling, use_container_width=True)
+    else:
+        rolling_placeholder.info("No rolling metrics available for the selected filters")
+
+add_section('rolling', rolling_query, params, render_rolling)
 
 # Chart 2: Pollutant Comparison
 st.markdown("### Pollutant Comparison")
 
 col_left, col_right = st.columns(2)
+pollutants_placeholder = col_left.empty()
+pollutants_placeholder.caption("⏳ Loading...")
+quality_placeholder = col_right.empty()
+quality_placeholder.caption("⏳ Loading...")
 
 # Average pollutants by station
 pollutants_query = """
@@ -238,7 +627,7 @@ pollutants_query = """
         ROUND(AVG(no2_clean)::numeric, 2) as NO2,
         ROUND(AVG(o3_clean)::numeric, 2) as O3,
         ROUND(AVG(pm10_clean)::numeric, 2) as PM10,
-        ROUND(AVG(pm25_clean)::numeric, 2) as PM2.5
+        ROUND(AVG(pm25_clean)::numeric, 2) as "PM2.5"
     FROM analytics_pollution
     WHERE measurement_date >= %s 
     AND measurement_date <= %s
@@ -247,33 +636,58 @@ pollutants_query = """
 params = [date_range[0], date_range[1]]
 
 if selected_station:
-    pollutants_query += " AND station_code = %s"
-    params.append(selected_station)
+    pollutants_query += " AND source_id = %s AND station_code = %s"
+    params.extend(selected_station)
 
 pollutants_query += " GROUP BY station_name"
 
-pollutants_df = query_analytics_data(pollutants_query, params)
+def render_pollutants(pollutants_df):
+    """Draw the per-station pollutant bar chart"""
+    if not pollutants_df.empty:
+        # Melt for easier plotting
+        pollutants_melted = pollutants_df.melt(
+            id_vars=['station_name'],
+            var_name='Pollutant',
+            value_name='Concentration'
+        )
+        
+        fig_pollutants = px.bar(
+            pollutants_melted,
+            x='station_name',
+            y='Concentration',
+            color='Pollutant',
+            title='Average Pollutant Levels by Station',
+            barmode='group',
+            height=400
+        )
+        pollutants_placeholder.plotly_chart(fig_pollutants, use_container_width=True)
+    else:
+        pollutants_placeholder.info("No pollutant data available")
+
+# Coarser answer from the daily aggregates, weighted by records per day
+pollutants_fallback_query = """
+    SELECT 
+        station_name,
+        ROUND((SUM(avg_so2 * records_count) / NULLIF(SUM(records_count), 0))::numeric, 2) as SO2,
+        ROUND((SUM(avg_no2 * records_count) / NULLIF(SUM(records_count), 0))::numeric, 2) as NO2,
+        ROUND((SUM(avg_o3 * records_count) / NULLIF(SUM(records_count), 0))::numeric, 2) as O3,
+        ROUND((SUM(avg_pm10 * records_count) / NULLIF(SUM(records_count), 0))::numeric, 2) as PM10,
+        ROUND((SUM(avg_pm25 * records_count) / NULLIF(SUM(records_count), 0))::numeric, 2) as "PM2.5"
+    FROM daily_aggregations_pollution
+    WHERE aggregation_date >= %s 
+    AND aggregation_date <= %s
+"""
 
-if not pollutants_df.empty:
-    # Melt for easier plotting
-    pollutants_melted = pollutants_df.melt(
-        id_vars=['station_name'],
-        var_name='Pollutant',
-        value_name='Concentration'
-    )
-    
-    fig_pollutants = px.bar(
-        pollutants_melted,
-        x='station_name',
-        y='Concentration',
-        color='Pollutant',
-        title='Average Pollutant Levels by Station',
-        barmode='group',
-        height=400
-    )
-    col_left.plotly_chart(fig_pollutants, use_container_width=True)
-else:
-    col_left.info("No pollutant data available")
+fallback_params = [date_range[0], date_range[1]]
+
+if selected_station:
+    pollutants_fallback_query += " AND source_id = %s AND station_code = %s"
+    fallback_params.extend(selected_station)
+
+pollutants_fallback_query += " GROUP BY station_name"
+
+add_section('pollutants', pollutants_query, params, render_pollutants,
+            fallback=(pollutants_fallback_query, fallback_params))
 
 # Air Quality Distribution
 quality_query = """
@@ -288,8 +702,8 @@ quality_query = """
 params = [date_range[0], date_range[1]]
 
 if selected_station:
-    quality_query += " AND station_code = %s"
-    params.append(selected_station)
+    quality_query += " AND source_id = %s AND station_code = %s"
+    params.extend(selected_station)
 
 if pollution_categories:
     placeholders = ','.join(['%s'] * len(pollution_categories))
@@ -298,20 +712,22 @@ if pollution_categories:
 
 quality_query += " GROUP BY pollution_category"
 
-quality_df = query_analytics_data(quality_query, params)
+def render_quality(quality_df):
+    """Draw the air quality category pie chart"""
+    if not quality_df.empty:
+        fig_quality = px.pie(
+            quality_df,
+            values='count',
+            names='pollution_category',
+            title='Air Quality Distribution',
+            height=400,
+            color_discrete_sequence=px.colors.qualitative.Set2
+        )
+        quality_placeholder.plotly_chart(fig_quality, use_container_width=True)
+    else:
+        quality_placeholder.info("No quality distribution data")
 
-if not quality_df.empty:
-    fig_quality = px.pie(
-        quality_df,
-        values='count',
-        names='pollution_category',
-        title='Air Quality Distribution',
-        height=400,
-        color_discrete_sequence=px.colors.qualitative.Set2
-    )
-    col_right.plotly_chart(fig_quality, use_container_width=True)
-else:
-    col_right.info("No quality distribution data")
+add_section('quality', quality_query, params, render_quality)
 
 # ============================================
 # DETAILED DATA TABLE
@@ -319,6 +735,8 @@ else:
 
 st.markdown("---")
 st.markdown("## 📋 Detailed Data")
+detail_placeholder = st.empty()
+detail_placeholder.caption("⏳ Loading...")
 
 detail_query = """
     SELECT 
@@ -329,7 +747,7 @@ detail_query = """
         ROUND(no2_clean::numeric, 2) as NO2,
         ROUND(o3_clean::numeric, 2) as O3,
         ROUND(pm10_clean::numeric, 2) as PM10,
-        ROUND(pm25_clean::numeric, 2) as PM2.5,
+        ROUND(pm25_clean::numeric, 2) as "PM2.5",
         ROUND(air_quality_index::numeric, 2) as AQI,
         pollution_category,
         data_quality_flag
@@ -341,8 +759,8 @@ detail_query = """
 params = [date_range[0], date_range[1]]
 
 if selected_station:
-    detail_query += " AND station_code = %s"
-    params.append(selected_station)
+    detail_query += " AND source_id = %s AND station_code = %s"
+    params.extend(selected_station)
 
 if pollution_categories:
     placeholders = ','.join(['%s'] * len(pollution_categories))
@@ -351,21 +769,24 @@ if pollution_categories:
 
 detail_query += " ORDER BY measurement_date DESC LIMIT 500"
 
-detail_df = query_analytics_data(detail_query, params)
+def render_detail(detail_df):
+    """Show the detail table and its CSV download"""
+    if not detail_df.empty:
+        with detail_placeholder.container():
+            st.dataframe(detail_df, use_container_width=True, height=400)
+            
+            # Download button
+            csv = detail_df.to_csv(index=False)
+            st.download_button(
+                label="📥 Download Data as CSV",
+                data=csv,
+                file_name=f"pollution_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime="text/csv"
+            )
+    else:
+        detail_placeholder.info("No detailed data available for the selected date range and filters")
 
-if not detail_df.empty:
-    st.dataframe(detail_df, use_container_width=True, height=400)
-    
-    # Download button
-    csv = detail_df.to_csv(index=False)
-    st.download_button(
-        label="📥 Download Data as CSV",
-        data=csv,
-        file_name=f"pollution_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        mime="text/csv"
-    )
-else:
-    st.info("No detailed data available for the selected date range and filters")
+add_section('detail', detail_query, params, render_detail)
 
 # ============================================
 # FOOTER & INSIGHTS
@@ -406,4 +827,52 @@ st.markdown("""
 **Data Source**: Analytics table from ELT Pipeline  
 **Last Updated**: Real-time from PostgreSQL  
 **Dashboard**: Built with Streamlit
-""")
\ No newline at end of file
+""")
+
+# ============================================
+# RENDER RESULTS
+# ============================================
+
+# All section queries run concurrently; each one is drawn as soon as it
+# finishes, so a slow widget does not hold up the rest of the page.
+section_futures = {
+    submit_query(section['query'], section['params'], section['fallback']): section
+    for section in dashboard_sections
+}
+
+timeout_seconds = QUERY_TIMEOUT_MS / 1000
+
+def render_section(section, future):
+    """Draw one finished section, with a notice for fallbacks and failures"""
+    try:
+        section_df, used_fallback = future.result()
+        if used_fallback:
+            section['notice'].warning(
+                f"⏱️ The detailed query took longer than {timeout_seconds:g}s, "
+                "showing daily pre-aggregated values instead"
+            )
+    except QueryTimeout:
+        section['notice'].warning(
+            f"⏱️ Query stopped after {timeout_seconds:g}s. Try a shorter date range or a single station."
+        )
+        section_df = pd.DataFrame()
+    except Exception as e:
+        logger.error(f"Query error in {section['name']}: {str(e)}")
+        section['notice'].error(f"Query failed: {str(e)}")
+        section_df = pd.DataFrame()
+    section['render'](section_df)
+
+# Poll instead of blocking in as_completed(): Streamlit only notices a rerun
+# (filter change) at the next st.* call, so the status line is refreshed on
+# every tick. If the rerun/stop exception comes through here, the finally
+# block cancels this run's queries right away.
+try:
+    pending = set(section_futures)
+    while pending:
+        loading_status.caption(f"⏳ Loading {len(pending)} of {len(section_futures)} sections...")
+        done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+        for future in done:
+            render_section(section_futures[future], future)
+    loading_status.empty()
+finally:
+    st.session_state['query_batch'].cancel()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Airflow puts the DAGs folder on sys.path; do the same so the DAG helper
+# modules import the way they do on a worker
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dags'))
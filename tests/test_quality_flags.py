@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from air_quality import (
+    FLATLINE_READINGS, SKETCH_BINS, STATS_MIN_SAMPLES,
+    score_series, sketch_bins, sketch_quantile,
+)
+
+
+def empty_state():
+    return {
+        'sample_count': 0,
+        'running_mean': 0.0,
+        'running_m2': 0.0,
+        'last_value': None,
+        'last_timestamp': None,
+        'repeat_value': None,
+        'repeat_count': 0,
+        'quantile_sketch': np.zeros(SKETCH_BINS, dtype=np.int64),
+    }
+
+
+def score(values, state=None, resolution=0.1, start='2024-01-01 00:00'):
+    values = np.asarray(values, dtype=float)
+    timestamps = list(pd.date_range(start, periods=len(values), freq='h'))
+    state = empty_state() if state is None else state
+    flags = score_series(values.tolist(), sketch_bins(values).tolist(), timestamps, state, resolution)
+    return flags, state
+
+
+@pytest.fixture
+def baseline():
+    # Two hundred hours around 20 with hour-to-hour noise
+    return list(np.random.default_rng(3).normal(20, 2, 200).round(1))
+
+
+def test_welford_state_matches_numpy(baseline):
+    flags, state = score(baseline)
+    assert set(flags) == {'clean'}
+    assert state['sample_count'] == len(baseline)
+    assert state['running_mean'] == pytest.approx(np.mean(baseline))
+    assert state['running_m2'] / state['sample_count'] == pytest.approx(np.var(baseline))
+
+
+def test_state_carries_across_batches(baseline):
+    _, one_shot = score(baseline)
+    _, state = score(baseline[:120])
+    score(baseline[120:], state, start='2024-01-06 00:00')
+    for key in ('sample_count', 'running_mean', 'running_m2', 'last_value', 'repeat_count'):
+        assert state[key] == pytest.approx(one_shot[key])
+    assert (state['quantile_sketch'] == one_shot['quantile_sketch']).all()
+
+
+def test_first_batch_is_checked_once_trusted(baseline):
+    values = list(baseline)
+    values[STATS_MIN_SAMPLES - 10] = 200.0  # not enough history yet
+    values[150] = 200.0
+    flags, _ = score(values)
+    assert flags[STATS_MIN_SAMPLES - 10] == 'clean'
+    assert flags[150] == 'spike_detected'
+
+
+def test_recovery_after_spike_is_clean(baseline):
+    values = list(baseline)
+    values[150] = 200.0
+    flags, state = score(values)
+    assert flags[151] == 'clean'
+    # The spike is kept out of the statistics
+    assert state['sample_count'] == len(values) - 1
+
+
+def test_spike_needs_the_previous_hour(baseline):
+    _, state = score(baseline)
+    # Six hours after the last reading: a large change is not an hour-to-hour jump
+    flags, _ = score([45.0], state, start='2024-01-09 14:00')
+    assert flags == ['zscore_outlier']
+
+
+def test_level_shift_is_learned(baseline):
+    shifted = list(np.random.default_rng(4).normal(60, 2, 48).round(1))
+    flags, state = score(baseline + shifted)
+    new_level = flags[len(baseline):]
+    assert new_level[0] == 'spike_detected'
+    assert new_level[-20:] == ['clean'] * 20
+    assert state['running_mean'] > 25
+
+
+def test_flatline_after_repeated_readings(baseline):
+    values = list(baseline)
+    values[150:160] = [22.0] * 10
+    flags, _ = score(values, resolution=0.1)
+    assert flags[150:150 + FLATLINE_READINGS - 1] == ['clean'] * (FLATLINE_READINGS - 1)
+    assert flags[150 + FLATLINE_READINGS - 1:160] == ['sensor_flatline'] * (10 - FLATLINE_READINGS + 1)
+
+
+def test_flatline_tolerates_float_noise_at_resolution(baseline):
+    values = list(baseline)
+    values[150:160] = [22.0, 22.00000001, 21.99999999] * 3 + [22.0]
+    flags, _ = score(values, resolution=0.1)
+    assert flags[159] == 'sensor_flatline'
+
+
+def test_coarse_resolution_repeats_are_not_flatline(baseline):
+    # With a 1-unit resolution and std ~2, repeated values are normal
+    values = list(np.round(baseline))
+    values[150:160] = [22.0] * 10
+    flags, _ = score(values, resolution=1)
+    assert 'sensor_flatline' not in flags
+
+
+def test_sketch_quantile_is_within_relative_error():
+    values = np.random.default_rng(5).lognormal(3, 0.5, 20000)
+    counts = np.bincount(sketch_bins(values), minlength=SKETCH_BINS)
+    for q in (0.5, 0.9, 0.99):
+        assert sketch_quantile(counts, q) == pytest.approx(np.quantile(values, q), rel=0.05)
+
+
+def test_sketch_quantile_of_empty_sketch_is_nan():
+    assert np.isnan(sketch_quantile(np.zeros(SKETCH_BINS), 0.99))
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from air_quality import compute_nowcast, compute_rolling_metrics
+
+
+def hourly_series(values, start='2024-01-01 00:00'):
+    return pd.Series(values, index=pd.date_range(start, periods=len(values), freq='h'), dtype=float)
+
+
+def test_nowcast_reference_value():
+    # Newest hour 40, previous eleven 20: min/max = 0.5 so w = 0.5 and
+    # (40 + 20 * sum(0.5^1..0.5^11)) / sum(0.5^0..0.5^11) = 30.002... -> 30.0
+    values = np.array([20.0] * 11 + [40.0])
+    assert compute_nowcast(values)[-1] == 30.0
+
+
+def test_nowcast_weight_floor_is_half():
+    # min/max = 0.1 is raised to the 0.5 floor, same result as above
+    values = np.array([4.0] * 11 + [40.0])
+    expected = np.floor((40 + 4 * sum(0.5 ** i for i in range(1, 12))) / sum(0.5 ** i for i in range(12)) * 10) / 10
+    assert compute_nowcast(values)[-1] == expected
+
+
+def test_nowcast_constant_series():
+    assert compute_nowcast(np.full(12, 17.3))[-1] == 17.3
+
+
+def test_nowcast_needs_two_of_three_recent_hours():
+    values = np.full(12, 20.0)
+    values[-1] = np.nan
+    assert compute_nowcast(values)[-1] == 20.0
+
+    values[-2] = np.nan
+    assert np.isnan(compute_nowcast(values)[-1])
+
+
+def test_avg_24h_requires_75_percent_of_hours():
+    values = [10.0] * 24
+    for hour in range(7):
+        values[hour] = np.nan
+    rows, _ = compute_rolling_metrics(hourly_series(values))
+    hour, avg_24h, _, _, _, hours_in_window = rows[-1]
+    assert hours_in_window == 17
+    assert avg_24h is None
+
+    values[6] = 10.0
+    rows, _ = compute_rolling_metrics(hourly_series(values))
+    assert rows[-1][5] == 18
+    assert rows[-1][1] == 10.0
+
+
+def test_missing_hours_are_gaps_not_zero():
+    # Hours 10-13 are absent from the input entirely
+    series = hourly_series([30.0] * 24)
+    series = series.drop(series.index[10:14])
+    rows, _ = compute_rolling_metrics(series)
+    assert rows[-1][1] == 30.0
+    assert rows[-1][5] == 20
+
+
+def assert_same_rows(got, want):
+    assert len(got) == len(want)
+    for got_row, want_row in zip(got, want):
+        assert got_row[0] == want_row[0]
+        for got_value, want_value in zip(got_row[1:], want_row[1:]):
+            if want_value is None or isinstance(want_value, str):
+                assert got_value == want_value
+            else:
+                assert got_value == pytest.approx(want_value)
+
+
+def test_incremental_matches_one_shot():
+    rng = np.random.default_rng(7)
+    values = rng.uniform(5, 80, 96).round(1)
+    values[[5, 30, 31, 32, 60, 61, 62, 63, 64, 90]] = np.nan
+    series = hourly_series(values).dropna()  # missing hours never reach the transform
+
+    one_shot, one_shot_state = compute_rolling_metrics(series)
+
+    incremental = []
+    last_hour, window = None, []
+    for batch in (series.iloc[:20], series.iloc[20:33], series.iloc[33:70], series.iloc[70:]):
+        rows, (last_hour, window) = compute_rolling_metrics(batch, last_hour, window)
+        incremental.extend(rows)
+
+    assert_same_rows(incremental, one_shot)
+    assert last_hour == one_shot_state[0]
+    assert window == one_shot_state[1]
+
+
+def test_hours_already_processed_are_ignored():
+    series = hourly_series([20.0] * 30)
+    _, (last_hour, window) = compute_rolling_metrics(series)
+    rows, state = compute_rolling_metrics(series.iloc[-5:], last_hour, window)
+    assert rows == []
+    assert state is None
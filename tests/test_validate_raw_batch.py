@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from air_quality import validate_raw_batch
+
+VALID_RANGES = {
+    'SO2': [0, 1],
+    'NO2': [0, 1],
+    'O3': [0, 1],
+    'CO': [0.1, 50],
+    'PM10': [0, 2000],
+    'PM2.5': [0, 1000],
+}
+KNOWN_STATIONS = {'101', '102'}
+
+GOOD_ROW = {
+    'Measurement date': '2017-01-01 00:00',
+    'Station code': '101',
+    'Station name': 'Jongno-gu',
+    'SO2': 0.004,
+    'NO2': 0.059,
+    'O3': 0.002,
+    'CO': 1.2,
+    'PM10': 73,
+    'PM2.5': 57,
+}
+
+
+def validate(*changes):
+    df = pd.DataFrame([{**GOOD_ROW, **change} for change in changes])
+    return validate_raw_batch(df, VALID_RANGES, KNOWN_STATIONS)
+
+
+@pytest.mark.parametrize('change, reason', [
+    ({'Measurement date': 'not a date'}, 'invalid_timestamp'),
+    ({'Station code': ''}, 'missing_station_code'),
+    ({'Station code': None}, 'missing_station_code'),
+    ({'Station code': '999'}, 'unknown_station'),
+    ({'PM10': 'n/a'}, 'non_numeric_value:PM10'),
+    ({'SO2': -1}, 'negative_value:SO2'),
+    ({'CO': 0.05}, 'below_range:CO'),
+    ({'NO2': 3.5}, 'out_of_range:NO2'),
+    ({'PM2.5': 1500}, 'out_of_range:PM2.5'),
+])
+def test_reason_codes(change, reason):
+    clean_df, rejected_df = validate({}, change)
+    assert len(clean_df) == 1
+    assert rejected_df['reason_codes'].tolist() == [reason]
+    assert rejected_df.index.tolist() == [1]  # position in the source file is kept
+
+
+def test_reasons_are_combined():
+    _, rejected_df = validate({'Station code': '999', 'SO2': -1, 'PM10': 5000})
+    assert rejected_df['reason_codes'].iat[0].split(',') == [
+        'unknown_station', 'negative_value:SO2', 'out_of_range:PM10'
+    ]
+
+
+def test_missing_readings_are_allowed():
+    clean_df, rejected_df = validate({'PM2.5': np.nan, 'O3': None})
+    assert rejected_df.empty
+    assert clean_df['pm25'].isna().all()
+    assert clean_df['o3'].isna().all()
+
+
+def test_clean_rows_have_raw_table_columns():
+    clean_df, _ = validate({})
+    assert list(clean_df.columns) == [
+        'measurement_date', 'station_code', 'station_name', 'so2', 'no2', 'o3', 'co', 'pm10', 'pm25'
+    ]
+    # Integer CSV columns are loaded as float so psycopg2 can adapt them
+    assert clean_df['pm10'].dtype == float
+    assert clean_df['measurement_date'].iat[0] == pd.Timestamp('2017-01-01 00:00')
+
+
+def test_unknown_station_check_disabled_without_station_set():
+    df = pd.DataFrame([{**GOOD_ROW, 'Station code': '999'}])
+    clean_df, rejected_df = validate_raw_batch(df, VALID_RANGES)
+    assert len(clean_df) == 1
+    assert rejected_df.empty